@@ -7,27 +7,86 @@ import numpy as np
 import matplotlib.pyplot as plt
 import re
 import os
-import keyboard
+import functools
+import concurrent.futures
+import signal
+try:
+  from numba import njit # optional; only used to speed up the projection
+except ImportError:
+  njit = None
 
 def HelpAndExit():
   print("Usage: ", sys.argv[0], " [-b BeginF] [-e EndF] [-p Points/Decade] [-f FILE_Prefix]\
   \noptional: [-n] Don't plot after gathering data\
   \noptional: [-z] Set current-measuring resistance and plot Z data\
+  \noptional: [-d] Print per-channel sin/cos detail for every point\
 \nFILE_Prefix defaults to RG1054Z\
 \nJohn Pigott Sep 2, 2018"\
   )
   sys.exit(1)    
 
+def StopSweep(signum, frame): # Ctrl-C ends the sweep early; what was measured so far is still logged & plotted
+  global Abort
+  Abort = True
+  signal.signal(signal.SIGINT, signal.default_int_handler) # a 2nd Ctrl-C still breaks out of a wait that never ends (e.g. no trigger)
+
+def SnapTimebase(TB): # Smallest 1-2-5 step >= TB, which is what the scope rounds a requested s/div up to
+  Decade = 10.0**math.floor(math.log10(TB))
+  for Step in (1, 2, 5):
+    if Step*Decade >= TB*(1-1e-9): return Step*Decade
+  return 10*Decade
+
 def NextArg(i): #Return the next command line argument (if there is one)
   if ((i+1) >= len(sys.argv)):
     Fatal("'%s' expected an argument" % sys.argv[i])
   return(1, sys.argv[i+1])
 
+@functools.lru_cache(maxsize=32) # ~32 bases of up to 2*MDEPTH complex points is a few MB
+def Phasor(NCYCLES, NPOINTS): # Unit phasor over NCYCLES whole cycles & its sum; reused across sweep points of equal size
+  SAMPLEPOINTS = np.linspace(0, NCYCLES*2*np.pi, NPOINTS)
+  PHASOR = np.exp(1j*SAMPLEPOINTS) # cos + j*sin; one complex dot per channel instead of separate sin & cos dots
+  return PHASOR, PHASOR.sum()
+
+# Projection is linear, so YOFF & YINCR are folded into the result rather than applied to every sample:
+#   mean((CURVE-YOFF)*YINCR*PHASOR) = YINCR*(CURVE.PHASOR - YOFF*sum(PHASOR))/N
+SCRATCH = np.empty(0, dtype=complex) # reused by Project() to widen the raw bytes without a fresh allocation per call
+
+def Project(CURVE, YOFF, YINCR, PHASOR, PHASOR_SUM): # Mean of the scaled raw CURVE times PHASOR
+  global SCRATCH
+  N = len(CURVE)
+  if (len(SCRATCH) < N): SCRATCH = np.empty(N, dtype=complex) # grows when MDEPTH doubles
+  np.copyto(SCRATCH[:N], CURVE)
+  return YINCR*(np.dot(SCRATCH[:N], PHASOR) - YOFF*PHASOR_SUM)/N
+
+if njit is not None:
+  @njit(cache=True, fastmath=True)
+  def Project(CURVE, YOFF, YINCR, PHASOR, PHASOR_SUM): # Same, in one pass over the raw bytes with no temporaries
+    S = 0j
+    for i in range(CURVE.shape[0]):
+      S += CURVE[i]*PHASOR[i]
+    return YINCR*(S - YOFF*PHASOR_SUM)/CURVE.shape[0]
+
+WAVSource = None # channel the scope's :WAV:SOURCE currently points at
+
+def Source(SOURCE): # ":WAV:SOURCE x;" prefix, empty if the scope is already there
+  global WAVSource
+  if SOURCE == WAVSource: return ""
+  WAVSource = SOURCE
+  return ":WAV:SOURCE %s;" % SOURCE
+
+def ReadCurve(SCOPE, SOURCE, NPOINTS, VERTICAL=None): # Download one channel's raw bytes; VERTICAL is its cached (YOFF, YINCR), None to refresh from the preamble
+  if VERTICAL is None: # range changed since last read
+    PreambleList = SCOPE.query(Source(SOURCE) + ":WAV:PREAMBLE?").split(',')
+    VERTICAL = (int(PreambleList[8]) + int(PreambleList[9]), float(PreambleList[7]))
+  CURVE = SCOPE.query_binary_values(Source(SOURCE) + ":WAV:START 1;:WAV:STOP %i;:WAV:DATA?" % NPOINTS, datatype='b', container=np.array, header_fmt=u'ieee', expect_termination=False, data_points=NPOINTS)
+  return CURVE, VERTICAL
+
   
 ######################################### main ##################################
 debug = 0
 FILEPREFIX  = "RG1054Z"  
 MDEPTH = 30000
+RAD2DEG = 180/math.pi
 #pdb.set_trace()
 StartF = 1
 StopF = 1e6
@@ -69,28 +128,36 @@ if (ListOnly): PlotOK = False # don't plot if just listing
 GPIB = visa.ResourceManager()
 #print(GPIB.list_resources())
 GPIB_Resources = GPIB.list_resources()
-for resource in GPIB_Resources: print(resource)
+USB_INSTR = re.compile('^USB.*:(SDG|DS).*INSTR$') # one compiled pass sorts resources into generator & scope
+USB_Resources = {}
+for resource in GPIB_Resources:
+  print(resource)
+  Match = USB_INSTR.search(resource)
+  if Match: USB_Resources.setdefault(Match.group(1), resource) # first match wins
 print()
 
-LOGFile = open(FILEPREFIX+"_VNA.log" if (not ListOnly) else os.devnull, 'w')
+LOGFile = open(FILEPREFIX+"_VNA.log" if (not ListOnly) else os.devnull, 'w', buffering=1<<16)
 #else: LOGFile = open(os.devnull, 'w')
 print(time.strftime("# %Y-%m-%d %H:%M"), file = LOGFile)
 
 #GPIB_BUS = GPIB.open_resource('GPIB0::INTFC')
 
-SDG1025 = GPIB.open_resource([_ for _ in GPIB_Resources if re.search('^USB.*:SDG.*INSTR$', _)][0])
+SDG1025 = GPIB.open_resource(USB_Resources['SDG'])
 #SDG1025 = GPIB.open_resource('USB0::0xF4ED::0xEE3A::SDG00004120363::INSTR') 
 Q = SDG1025.query("*IDN?")
 print("SDG1025:", Q, end='')
 print("# SDG1025:", Q, end='', file=LOGFile)
 
-DS1054Z = GPIB.open_resource([_ for _ in GPIB_Resources if re.search('^USB.*:DS.*INSTR$', _)][0])
+DS1054Z = GPIB.open_resource(USB_Resources['DS'])
 #DS1054Z = GPIB.open_resource('USB0::0x1AB1::0x04CE::DS1ZA201003553::INSTR') 
 Q = DS1054Z.query("*IDN?")
 print("DS1054Z:", Q)
 print("# DS1054Z:", Q, end='', file=LOGFile)
 
 DS1054Z.timeout = 2000 # ms
+DS1054Z.chunk_size = 1<<20 # one bulk read per :WAV:DATA? block instead of many 20 kB chunks
+DS1054Z.read_termination = None # USB-TMC ends messages itself; don't scan binary blocks for LF
+DS1054Z.write_termination = '\n'
 
 DecadesF = math.log10(StopF/StartF)
 
@@ -115,34 +182,20 @@ DS1054Z.write(":WAV:FORMAT BYTE;:WAV:MODE RAW")
 
 DS1054Z.write(":STOP") # so preamble can get YINCR
 
-#Channel 1
-DS1054Z.write(":CHANNEL1:COUPLING AC")
-DS1054Z.write(":CHANNEL1:DISPLAY ON")
-DS1054Z.write(":CHANNEL1:SCALE 5")
-DS1054Z.write(":CHANNEL1:BWLimit 20M")
-print("1: ",DS1054Z.query(":WAV:SOURCE CHAN1;:WAV:PREAMBLE?"), end='')
+#Channel 1 (one chained command per block saves a USB round trip per setting)
+DS1054Z.write(":CHANNEL1:COUPLING AC;:CHANNEL1:DISPLAY ON;:CHANNEL1:SCALE 5;:CHANNEL1:BWLimit 20M")
+print("1: ",DS1054Z.query(Source("CHAN1") + ":WAV:PREAMBLE?"), end='')
 
 #Channel 2
-DS1054Z.write(":CHANNEL2:COUPLING AC")
-DS1054Z.write(":CHANNEL2:DISPLAY ON")
-DS1054Z.write(":CHANNEL2:SCALE 5")
-DS1054Z.write(":CHANNEL2:BWLimit 20M")
-print("2: ",DS1054Z.query(":WAV:SOURCE CHAN2;:WAV:PREAMBLE?"))
+DS1054Z.write(":CHANNEL2:COUPLING AC;:CHANNEL2:DISPLAY ON;:CHANNEL2:SCALE 5;:CHANNEL2:BWLimit 20M")
+print("2: ",DS1054Z.query(Source("CHAN2") + ":WAV:PREAMBLE?"))
 
 #Channel 4 (Trigger)
-DS1054Z.write(":CHANNEL4:COUPLING DC")
-DS1054Z.write(":CHANNEL4:DISPLAY OFF")
-DS1054Z.write(":CHANNEL4:SCALE 5.0")
-DS1054Z.write(":TRIGGER:MODE EDGE")
-DS1054Z.write(":TRIGGER:EDGE:SOURCE CHANNEL4")
-DS1054Z.write(":TRIGGER:COUPLING DC")
-DS1054Z.write(":TRIGGER:EDGE:SLOPE POSITIVE")
-DS1054Z.write(":TRIGGER:EDGE:LEVEL 2.5")
-
-DS1054Z.write(":RUN")
-DS1054Z.write(":ACQUIRE:MDEPTH %i" % MDEPTH)
-VNA=[]
-#DS1054Z.chunk_size = MDEPTH
+DS1054Z.write(":CHANNEL4:COUPLING DC;:CHANNEL4:DISPLAY OFF;:CHANNEL4:SCALE 5.0")
+DS1054Z.write(":TRIGGER:MODE EDGE;:TRIGGER:EDGE:SOURCE CHANNEL4;:TRIGGER:COUPLING DC;:TRIGGER:EDGE:SLOPE POSITIVE;:TRIGGER:EDGE:LEVEL 2.5")
+
+DS1054Z.write(":RUN;:ACQUIRE:MDEPTH %i" % MDEPTH)
+LOGRow = "{:6d}, {:12.3f}, {:9.5f}, {:9.5f},    {:7.2f}, {:7.2f},  {}\n"
 
 print("#Sample,  Frequency,      Mag1,      Mag2, Ratio (dB),   Phase", file = LOGFile)
 
@@ -150,28 +203,37 @@ if SweepModeLog:
   LastTestPOINT = 1 + math.ceil(PointsPerDecade*math.log10(StopF/StartF))
 else:
   LastTestPOINT = 1 + math.ceil((StopF-StartF)/StepSizeF)
+if SweepModeLog:
+  FREQS = StartF*10.0**(np.arange(LastTestPOINT)/PointsPerDecade)
+else:
+  FREQS = StartF+np.arange(LastTestPOINT)*StepSizeF
+FREQS = FREQS[FREQS <= min(StopF, 25e6)] # 25 MHz is max frequency of SDG1025
+# VNA results, one preallocated column each; row POINT is measured at FREQS[POINT]
+VNA_dB, VNA_Ph, VNA_Z = np.empty(len(FREQS)), np.empty(len(FREQS)), np.empty(len(FREQS), dtype=complex)
+VNA_N = 0 # rows filled so far
+
+# Ch2 is downloaded on a worker while Ch1 is projected; the scope session is only touched by one thread at a time
+READER = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+Abort = False
+signal.signal(signal.SIGINT, StopSweep)
+SCALE2 = 5 # as set up above
+VERTICAL2 = None # Ch2 (YOFF, YINCR); only re-read from the preamble after Ch2 is rescaled
+TBQuery = True # 1st point checks SnapTimebase against the scope; stays on only if they disagree
 
 #for TestPOINT in range(-1, 1+math.ceil(PointsPerDecade*math.log10(StopF/StartF))):
-for TestPOINT in range(-1, LastTestPOINT):
+for TestPOINT in range(-1 if len(FREQS) else 0, len(FREQS)):
   # 1st cycle which is used to initialize vertical scale isn't logged
   POINT = max(0, TestPOINT) # -1 maps to 0
-  TestF = StartF*math.pow(10,POINT/PointsPerDecade) if SweepModeLog else StartF+POINT*StepSizeF
-  if (TestF > StopF): break
-  if (TestF > 25e6): break # Max frequency of SDG1025
-  if keyboard.is_pressed('q'):
-    print('Key pressed')
+  TestF = FREQS[POINT]
+  if Abort:
+    print('Interrupted')
     break
   print("Sample %3i, %11.3f Hz" % (TestPOINT, TestF), end='')
   if (ListOnly): print();continue # only list sample frequencies
 
   if (TestF >= SYNCMax) and not HighFrequency: # Can't generate sync above 2 MHz -- so switch to Channel 1. This also allows S/s to double
     SDG1025.write("C1:SYNC OFF")
-    DS1054Z.write(":CHANNEL4:DISPLAY OFF")
-    DS1054Z.write(":TRIGGER:COUPLING LFReject")
-    DS1054Z.write(":TRIGGER:MODE EDGE")
-    DS1054Z.write(":TRIGGER:EDGE:SOURCE CHANNEL1")
-    DS1054Z.write(":TRIGGER:EDGE:SLOPE POSITIVE")
-    DS1054Z.write(":TRIGGER:EDGE:LEVEL 0")
+    DS1054Z.write(":CHANNEL4:DISPLAY OFF;:TRIGGER:COUPLING LFReject;:TRIGGER:MODE EDGE;:TRIGGER:EDGE:SOURCE CHANNEL1;:TRIGGER:EDGE:SLOPE POSITIVE;:TRIGGER:EDGE:LEVEL 0")
     time.sleep(0.3) # wait for this to change
 
     MDEPTH *= 2  # double sample rate when Ch4 is not used by trigger
@@ -180,7 +242,12 @@ for TestPOINT in range(-1, LastTestPOINT):
   SDG1025.write("C1: BSWV FRQ, %11.3f" % TestF)
   #pdb.set_trace()
   DS1054Z.write(":TIMEBASE:MAIN:SCALE %13.9f" % (1./TestF/12.)) # Scope rounds up
-  ActualTB = float(DS1054Z.query(":TIMEBASE:MAIN:SCALE?").rstrip())
+  ActualTB = SnapTimebase(1./TestF/12.) # same rounding done locally; saves a query round trip per point
+  if TBQuery:
+    ScopeTB = DS1054Z.query_ascii_values(":TIMEBASE:MAIN:SCALE?", converter='f')[0] # parsed by pyvisa, no str->float here
+    TBQuery = abs(ScopeTB - ActualTB) > 1e-6*ActualTB
+    if TBQuery: print("\nTimebase %g s/div, expected %g; querying every point" % (ScopeTB, ActualTB))
+    ActualTB = ScopeTB
   ActualSs = min(250e6 if (TestF < SYNCMax) else 500e6, round(MDEPTH/(ActualTB*12),0))
   ActualSs_ = str(int(ActualSs))
   if (ActualSs_[-9:] == "000000000"): ActualSs_ = ActualSs_[:-9] + " G"
@@ -189,9 +256,10 @@ for TestPOINT in range(-1, LastTestPOINT):
   print(", %sS/s" % ActualSs_, end='')
   
   DS1054Z.write(":RUN;:TRIGGER:SWEEP SINGLE")
-  while (DS1054Z.query(":TRIGGER:STATUS?")[:4] != "STOP"): pass  
+  time.sleep(12*ActualTB) # a full screen can't be acquired any sooner; don't flood the bus with status queries meanwhile
+  while (DS1054Z.query(":TRIGGER:STATUS?")[:4] != "STOP"): time.sleep(0.01)
   
-  PreambleList = DS1054Z.query(":WAV:SOURCE CHAN1;:WAV:PREAMBLE?").split(',')
+  PreambleList = DS1054Z.query(Source("CHAN1") + ":WAV:PREAMBLE?").split(',')
   XINCR = float(PreambleList[4])
   YINCR1 = float(PreambleList[7])
   YOFF1 = int(PreambleList[8]) + int(PreambleList[9])
@@ -201,54 +269,58 @@ for TestPOINT in range(-1, LastTestPOINT):
   NPOINTS = int(round(NPOINTS_PerCycle * NCYCLES))
   print(", %i points; %i cycle%s @ %10.1f/cycle" % (NPOINTS, NCYCLES, " " if (NCYCLES==1) else "s", NPOINTS_PerCycle))
   
-  SAMPLEPOINTS = np.linspace(0, NCYCLES*2*np.pi, NPOINTS)
-  SINEARRAY = np.sin(SAMPLEPOINTS)
-  COSARRAY  = np.cos(SAMPLEPOINTS)
+  PHASOR, PHASOR_SUM = Phasor(NCYCLES, NPOINTS)
   
-  # DS1054Z has transfer errors over USB if over ~ 8200; download whole array and truncate is simplest
-  CURVE1=DS1054Z.query_binary_values(":WAV:START 1;:WAV:STOP %i;:WAV:DATA?" %(MDEPTH), datatype='b', container=np.array, header_fmt=u'ieee')[:NPOINTS]
-  CURVE1 = (CURVE1-YOFF1)*YINCR1
-
-  PreambleList = DS1054Z.query(":WAV:SOURCE CHAN2;:WAV:PREAMBLE?").split(',') # Refresh after range change
-  YINCR2 = float(PreambleList[7])
-  YOFF2 = int(PreambleList[8]) + int(PreambleList[9])
-  CURVE2=DS1054Z.query_binary_values(":WAV:START 1;:WAV:STOP %i;:WAV:DATA?" %(MDEPTH), datatype='b', container=np.array, header_fmt=u'ieee')[:NPOINTS]
-  CURVE2 = (CURVE2-YOFF2)*YINCR2
+  # Only the whole cycles that get projected are transferred, not the full MDEPTH record
+  CURVE1=DS1054Z.query_binary_values(":WAV:START 1;:WAV:STOP %i;:WAV:DATA?" %(NPOINTS), datatype='b', container=np.array, header_fmt=u'ieee', expect_termination=False, data_points=NPOINTS)
+
+  CURVE2_PENDING = READER.submit(ReadCurve, DS1054Z, "CHAN2", NPOINTS, VERTICAL2)
     
-  SINDOT1 = np.dot(CURVE1,SINEARRAY)/NPOINTS
-  COSDOT1 = np.dot(CURVE1,COSARRAY)/NPOINTS
+  PROJ1 = Project(CURVE1, YOFF1, YINCR1, PHASOR, PHASOR_SUM)
+  SINDOT1, COSDOT1 = PROJ1.imag, PROJ1.real
   CHANNEL1 = complex(SINDOT1, COSDOT1)
   MAG1 = 2*abs(CHANNEL1)
-  PHASE1 = np.angle(CHANNEL1)*180/math.pi
+  PHASE1 = math.atan2(COSDOT1, SINDOT1)*RAD2DEG # scalar: math, not a 0-d ufunc call
+
+  CURVE2, VERTICAL2 = CURVE2_PENDING.result() # scope is free again after this
+  YOFF2, YINCR2 = VERTICAL2
   DS1054Z.write(":CHANNEL1:SCALE %9.4f" % (MAG1/3)) 
 
-  SINDOT2 = np.dot(CURVE2,SINEARRAY)/NPOINTS
-  COSDOT2 = np.dot(CURVE2,COSARRAY)/NPOINTS
+  PROJ2 = Project(CURVE2, YOFF2, YINCR2, PHASOR, PHASOR_SUM)
+  SINDOT2, COSDOT2 = PROJ2.imag, PROJ2.real
   CHANNEL2 = complex(SINDOT2, COSDOT2)
   MAG2 = 2*abs(CHANNEL2)
-  PHASE2 = np.angle(CHANNEL2)*180/math.pi
-  DS1054Z.write(":CHANNEL2:SCALE %9.4f" % (MAG2/3))
+  PHASE2 = math.atan2(COSDOT2, SINDOT2)*RAD2DEG
+  if abs(MAG2/3 - SCALE2) > 0.1*SCALE2: # Ch1's preamble is needed for XINCR anyway, but Ch2's is only re-read when its range moves >10%
+    SCALE2 = MAG2/3
+    DS1054Z.write(":CHANNEL2:SCALE %9.4f" % SCALE2)
+    VERTICAL2 = None
   
   Channel_Z = CHANNEL2/(CHANNEL1-CHANNEL2)*Resistance
 
-  print("Ch1: Sin, Cos = %9.4f, %9.4f; Mag = %9.5f, Phase = %7.2f deg." % (SINDOT1, COSDOT1, MAG1, PHASE1))
-  print("Ch2: Sin, Cos = %9.4f, %9.4f; Mag = %9.5f, Phase = %7.2f deg." % (SINDOT2, COSDOT2, MAG2, PHASE2))
+  if debug: # per-channel detail only with -d; console output per point is otherwise one summary line
+    print("Ch1: Sin, Cos = %9.4f, %9.4f; Mag = %9.5f, Phase = %7.2f deg." % (SINDOT1, COSDOT1, MAG1, PHASE1))
+    print("Ch2: Sin, Cos = %9.4f, %9.4f; Mag = %9.5f, Phase = %7.2f deg." % (SINDOT2, COSDOT2, MAG2, PHASE2))
   Mag_dB = 20*math.log10(MAG2/MAG1)
   Phase = (PHASE2-PHASE1) % 360
   if (Phase) > 180: Phase -= 360  # center around +/- 180
   CHZ = '%12.4f %sj%12.4f' % (Channel_Z.real, '+-'[Channel_Z.imag < 0], abs(Channel_Z.imag))
-  print("Ch2:Ch1 = %7.2f dB @ %7.2f deg.; Z =" % (Mag_dB, Phase), CHZ, '\n')
+  print("Ch2:Ch1 = %7.2f dB @ %7.2f deg.; Z =" % (Mag_dB, Phase), CHZ, '\n' if debug else '')
   if (TestPOINT >= 0):  # only after 1st round
-    VNA.append((TestF, Mag_dB, Phase, Channel_Z))
-    print("%6i, %12.3f, %9.5f, %9.5f,    %7.2f, %7.2f, " %\
-         (POINT, TestF, MAG1, MAG2, Mag_dB, Phase), CHZ, file = LOGFile)
+    VNA_dB[POINT], VNA_Ph[POINT], VNA_Z[POINT] = Mag_dB, Phase, Channel_Z
+    VNA_N = POINT+1
+    LOGFile.write(LOGRow.format(POINT, TestF, MAG1, MAG2, Mag_dB, Phase, CHZ)) # as measured: a crash keeps the rows so far
 
+signal.signal(signal.SIGINT, signal.default_int_handler)
+READER.shutdown()
 LOGFile.close()
 DS1054Z.close()
 SDG1025.close()
 GPIB.close()
 print("Done")
 
+VNA_F, VNA_dB, VNA_Ph, VNA_Z = FREQS[:VNA_N], VNA_dB[:VNA_N], VNA_Ph[:VNA_N], VNA_Z[:VNA_N]
+
 if (PlotOK):
   fig, ax1 = plt.subplots()
   fig.canvas.set_window_title('VNA 2:1')
@@ -258,9 +330,9 @@ if (PlotOK):
   ax1.set_xlabel('Frequency (Hz)')
   ax1.set_ylabel('dB', color=color)
   if SweepModeLog: 
-    ax1.semilogx([_[0] for _ in VNA], [_[1] for _ in VNA], color=color)
+    ax1.semilogx(VNA_F, VNA_dB, color=color)
   else:
-    ax1.plot([_[0] for _ in VNA], [_[1] for _ in VNA], color=color)
+    ax1.plot(VNA_F, VNA_dB, color=color)
   ax1.tick_params(axis='y', labelcolor=color)
   ax1.grid(True)
   
@@ -269,10 +341,9 @@ if (PlotOK):
   color = 'tab:blue'
   ax2.set_ylabel('Phase (°)', color=color)  # we already handled the x-label with ax1
   if SweepModeLog: 
-      ax2.semilogx([_[0] for _ in VNA], [_[2] for _ in VNA], color=color)
-      ax2.semilogx([_[0] for _ in VNA], [_[2] for _ in VNA], color=color)
+      ax2.semilogx(VNA_F, VNA_Ph, color=color)
   else:
-      ax2.plot([_[0] for _ in VNA], [_[2] for _ in VNA], color=color)
+      ax2.plot(VNA_F, VNA_Ph, color=color)
   ax2.tick_params(axis='y', labelcolor=color)
   #ax2.grid(True)
   
@@ -290,9 +361,9 @@ if (PlotOK and Resistance != 0):
   ax1.set_xlabel('Frequency (Hz)')
   ax1.set_ylabel('|Z| (ohms)', color=color)
   if SweepModeLog: 
-    ax1.loglog(  [_[0] for _ in VNA], [abs(_[3]) for _ in VNA], color=color)
+    ax1.loglog(  VNA_F, np.abs(VNA_Z), color=color)
   else:
-    ax1.semilogy([_[0] for _ in VNA], [abs(_[3]) for _ in VNA], color=color) # Mag(Z)
+    ax1.semilogy(VNA_F, np.abs(VNA_Z), color=color) # Mag(Z)
   ax1.tick_params(axis='y', labelcolor=color)
   ax1.grid(True)
   
@@ -301,9 +372,9 @@ if (PlotOK and Resistance != 0):
   color = 'tab:purple'
   ax2.set_ylabel('Z∠ (°)', color=color)  # we already handled the x-label with ax1
   if SweepModeLog: 
-      ax2.semilogx([_[0] for _ in VNA], [np.angle(_[3])*180/math.pi for _ in VNA], color=color)
+      ax2.semilogx(VNA_F, np.angle(VNA_Z, deg=True), color=color)
   else:
-      ax2.plot(    [_[0] for _ in VNA], [np.angle(_[3])*180/math.pi for _ in VNA], color=color)
+      ax2.plot(    VNA_F, np.angle(VNA_Z, deg=True), color=color)
   ax2.tick_params(axis='y', labelcolor=color)
   #ax2.grid(True)
   
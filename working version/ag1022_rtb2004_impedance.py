@@ -32,7 +32,9 @@ Notes:
 """
 
 
-import sys, re, math, time
+import sys, re, math, time, array
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -50,8 +52,11 @@ class AG1022USB:
                 "AG1022 not found over USB. Close OWON Waveform and check driver (libusbK/WinUSB)."
             )
         self.timeout = timeout_ms
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         self.intf = self.ep_out = self.ep_in = None
         for itf in cfg:
             outs = [
@@ -76,22 +81,36 @@ class AG1022USB:
         if not self.intf:
             raise RuntimeError("No BULK IN/OUT endpoints found on AG1022 interface.")
         usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
+        self._in_mps = self.ep_in.wMaxPacketSize
+        # one packet-sized RX buffer reused by every read; pyusb fills an
+        # array.array in place instead of allocating a new one per call
+        self._rx = array.array("B", bytes(self._in_mps))
+        self._rx_mv = memoryview(self._rx)
+        self._rtt_ms = 20.0  # smoothed reply wait seen by query(); sets its timeout
 
     def _write_raw(self, s, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (s + "\n").encode("ascii"),
-            timeout=self.timeout,
-        )
+        self.ep_out.write((s + "\n").encode("ascii"), timeout=self.timeout)
         time.sleep(pause)
 
     def drain(self, tries=4):
         for _ in range(tries):
             try:
-                _ = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=10)
+                self.ep_in.read(self._rx, timeout=10)
             except usb.core.USBError:
                 break
 
+    def _read(self, timeout):
+        # one packet at a time; a short packet or a trailing LF ends the reply
+        n = self.ep_in.read(self._rx, timeout=timeout)
+        buf = bytearray(self._rx_mv[:n])
+        while n == self._in_mps and not buf.endswith(b"\n"):
+            try:
+                n = self.ep_in.read(self._rx, timeout=timeout)
+            except usb.core.USBError:
+                break
+            buf += self._rx_mv[:n]
+        return buf.decode("ascii", "ignore").strip()
+
     def write(self, s):
         self._write_raw(
             s
@@ -101,18 +120,26 @@ class AG1022USB:
         self.drain()
         self._write_raw(s)
         time.sleep(0.06)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 2048, timeout=self.timeout)
-        txt = bytes(data).decode("ascii", "ignore").strip()
+        # a few times the usual wait: healthy replies are unaffected, a dead
+        # link fails in a fraction of the old fixed 2 s / 300 ms
+        tmo = min(self.timeout, max(50, int(8 * self._rtt_ms)))
+        t0 = time.perf_counter()
+        txt = self._read(tmo)
+        self._rtt_ms += 0.2 * ((time.perf_counter() - t0) * 1e3 - self._rtt_ms)
         if txt == "->":  # ack arrived first; try one quick extra read
             try:
-                data2 = self.dev.read(self.ep_in.bEndpointAddress, 4096, timeout=300)
-                t2 = bytes(data2).decode("ascii", "ignore").strip()
+                t2 = self._read(tmo)
                 if t2:
                     txt = t2
             except usb.core.USBError:
                 pass
         return txt
 
+    def write_batch(self, cmds):
+        """Send several commands in order, each paced like write()."""
+        for s in cmds:
+            self.write(s)
+
     # Convenience
     def idn(self):
         return self.query("*IDN?")
@@ -124,21 +151,29 @@ class AG1022USB:
         self.write(f":CHAN:CH{1 if n==1 else 2} {'ON' if on else 'OFF'}")
 
     def set_sine(self, ch, f, vpp, offs=0.0, load="OFF"):
-        self.ch(ch)
-        self.write(":FUNC SINE")
-        self.write(f":FUNC:SINE:LOAD {load}")
-        self.write(f":FUNC:SINE:FREQ {f}")
-        self.write(f":FUNC:SINE:AMPL {vpp}")
-        self.write(f":FUNC:SINE:OFFS {offs}")
+        self.write_batch(
+            [
+                f":CHAN CH{1 if ch==1 else 2}",
+                ":FUNC SINE",
+                f":FUNC:SINE:LOAD {load}",
+                f":FUNC:SINE:FREQ {f}",
+                f":FUNC:SINE:AMPL {vpp}",
+                f":FUNC:SINE:OFFS {offs}",
+            ]
+        )
 
     def set_square(self, ch, f, vpp, offs=0.0, duty=50, load="OFF"):
-        self.ch(ch)
-        self.write(":FUNC SQU")
-        self.write(f":FUNC:SQU:LOAD {load}")
-        self.write(f":FUNC:SQU:FREQ {f}")
-        self.write(f":FUNC:SQU:AMPL {vpp}")
-        self.write(f":FUNC:SQU:OFFS {offs}")
-        self.write(f":FUNC:SQU:DCYC {duty}")
+        self.write_batch(
+            [
+                f":CHAN CH{1 if ch==1 else 2}",
+                ":FUNC SQU",
+                f":FUNC:SQU:LOAD {load}",
+                f":FUNC:SQU:FREQ {f}",
+                f":FUNC:SQU:AMPL {vpp}",
+                f":FUNC:SQU:OFFS {offs}",
+                f":FUNC:SQU:DCYC {duty}",
+            ]
+        )
 
 
 # ========= RTB2004 over PyVISA =========
@@ -152,11 +187,15 @@ def rm_open():
         return pyvisa.ResourceManager("@py")
 
 
+# model name, or an R&S (VID 0x0AAD) USB resource; one compiled pass per string
+RTB_RESOURCE = re.compile(r"RTB|USB\d*::0x0AAD::", re.I)
+
+
 def open_rtb(rm):
     res = rm.list_resources()
     cand = None
     for r in res:
-        if re.search(r"RTB|R&S.*RTB", r, re.I) or ("USB" in r and "0x0AAD" in r):
+        if RTB_RESOURCE.search(r):
             cand = r
             break
     if not cand:
@@ -166,29 +205,30 @@ def open_rtb(rm):
     inst.chunk_size = 1024 * 1024
     inst.read_termination = "\n"
     inst.write_termination = "\n"
-    # make sure scope is in a predictable state for data reads
-    inst.write("SYST:HEAD OFF")  # no verbose headers
-    inst.write("HIST:STAT OFF")  # history off
-    inst.write("ACQ:AVER:STAT OFF")  # averaging off
-    inst.write("ACQ:STOPA SEQ")  # single-acquisition mode
-    inst.write("FORM REAL,32; FORM:BORD LSBF")
-    inst.write("CHAN1:STAT 1; CHAN2:STAT 1")
-    inst.write("CHAN1:COUP DC; CHAN2:COUP DC")
-    inst.write("CHAN1:SCAL 5; CHAN2:SCAL 5")
+    # make sure scope is in a predictable state for data reads, in one
+    # compound message: no verbose headers, history and averaging off,
+    # single-acquisition mode, float32 LE data, CH1/CH2 on, DC, 5 V/div
+    inst.write(
+        "SYST:HEAD OFF; HIST:STAT OFF; ACQ:AVER:STAT OFF; ACQ:STOPA SEQ; "
+        "FORM REAL,32; FORM:BORD LSBF; CHAN1:STAT 1; CHAN2:STAT 1; "
+        "CHAN1:COUP DC; CHAN2:COUP DC; CHAN1:SCAL 5; CHAN2:SCAL 5"
+    )
     return inst
 
 
-def rtb_capture_pair(rtb, F, points, dwell_min=0.02):
+def rtb_capture_pair(rtb, F, points, dwell_min=0.02, on_frozen=None):
     """
     Deterministic single acquisition:
       - set timebase for ~12 periods
       - SING and wait *OPC?
+      - call on_frozen() (if given) once the shot is held in scope memory;
+        its result is returned as the 4th value
       - request bounded points
       - try REAL,32 binary; on timeout, fallback to ASCII for this step
     """
-    rtb.write(f"TIM:SCAL {1.0/F/12.0:.9f}")
-    rtb.write("SING")
-    rtb.query("*OPC?")  # wait until the single acquisition is finished
+    # one transaction; *OPC? answers once the single acquisition is finished
+    rtb.query(f"TIM:SCAL {1.0/F/12.0:.9f}; SING; *OPC?")
+    frozen = on_frozen() if on_frozen is not None else None
 
     # points request (must be after STOP to allow MAX/large requests)
     rtb.write(f"CHAN1:DATA:POIN {points}; CHAN2:DATA:POIN {points}")
@@ -223,7 +263,7 @@ def rtb_capture_pair(rtb, F, points, dwell_min=0.02):
             )
         )
         N = min(len(y1), len(y2), points)
-        return y1[:N], y2[:N], xincr
+        return y1[:N], y2[:N], xincr, frozen
     except pyvisa.errors.VisaIOError:
         # --- fallback: ASCII (slower but robust) ---
         rtb.write("FORM ASC")
@@ -234,7 +274,7 @@ def rtb_capture_pair(rtb, F, points, dwell_min=0.02):
         y2 = np.array(rtb.query_ascii_values("CHAN2:DATA?"), dtype=float)
         rtb.write("FORM REAL,32; FORM:BORD LSBF")  # restore for next step
         N = min(len(y1), len(y2), min(points, 5000))
-        return y1[:N], y2[:N], xincr
+        return y1[:N], y2[:N], xincr, frozen
 
 
 # ========= CLI =========
@@ -315,22 +355,50 @@ else:
 freqs = [f for f in freqs if f <= StopF and f <= 25e6]  # AG1022 guard
 
 # ========= Sweep =========
-VNA = []
+# Results as parallel arrays filled by index (VNA_N rows valid), not tuples
+VNA_F = np.empty(len(freqs))
+VNA_dB = np.empty(len(freqs))
+VNA_Ph = np.empty(len(freqs))
+VNA_Z = np.zeros(len(freqs), dtype=complex)
+VNA_N = 0
 ts = time.strftime("%Y-%m-%d %H:%M")
 log = open(FILEPREFIX + "_VNA.log", "w", encoding="utf-8")
 print(f"# {ts}", file=log)
 print("#Sample,  Frequency,      |Z|,      ∠Z (deg),   Mag(dB),   Phase(dg)", file=log)
 
 MDEPTH = 10000  # 10k points per channel (fast & reliable on RTB)
-for idx, F in enumerate(freqs):
-    # set generator
+
+
+def drive(F):
     if UseSquare:
         gen.set_square(1, F, Voltage, 0.0, duty=50)
     else:
         gen.set_sine(1, F, Voltage, 0.0)
 
-    # capture both channels
-    y1, y2, xincr = rtb_capture_pair(rtb, F, MDEPTH)
+
+# The generator has its own USB pipe: once a shot is frozen on the scope, the
+# next frequency is written on a worker while this one is still being read out.
+GEN = ThreadPoolExecutor(max_workers=1)
+pending = None
+
+
+def retune(F):
+    # start driving F on the worker; nothing to do after the last point
+    return GEN.submit(drive, F) if F is not None else None
+
+
+for idx, F in enumerate(freqs):
+    # set generator (or wait for the write started during the last point)
+    if pending is None:
+        drive(F)
+    else:
+        pending.result()
+    nxt = freqs[idx + 1] if idx + 1 < len(freqs) else None
+
+    # capture both channels; the next write starts as soon as the shot is frozen
+    y1, y2, xincr, pending = rtb_capture_pair(
+        rtb, F, MDEPTH, on_frozen=partial(retune, nxt)
+    )
 
     N = min(len(y1), len(y2))
     if N < 32:
@@ -356,8 +424,9 @@ for idx, F in enumerate(freqs):
 
     MAG1 = 2.0 * abs(V1)
     MAG2 = 2.0 * abs(V2)
-    PH1 = float(np.angle(V1, deg=True))
-    PH2 = float(np.angle(V2, deg=True))
+    # scalar math on plain floats; NumPy ufuncs on 0-d values are mostly dispatch
+    PH1 = math.degrees(math.atan2(C1, S1))
+    PH2 = math.degrees(math.atan2(C2, S2))
 
     # light autoscale for comfort (non-critical)
     rtb.write(f"CHAN1:SCAL {max(1e-3, MAG1/3):.4f}; CHAN2:SCAL {max(1e-3, MAG2/3):.4f}")
@@ -373,30 +442,32 @@ for idx, F in enumerate(freqs):
         if abs(denom) > 1e-15:
             Z = (V2 / denom) * Resistance
 
+    Zm, Zph = abs(Z), math.degrees(math.atan2(Z.imag, Z.real))
     print(
-        f"#{idx:03d}  f={F:11.3f} Hz  |Z|={abs(Z):.4g} Ω  ∠Z={np.angle(Z,deg=True):6.1f}°   "
+        f"#{idx:03d}  f={F:11.3f} Hz  |Z|={Zm:.4g} Ω  ∠Z={Zph:6.1f}°   "
         f"G={GdB:7.2f} dB  φ={Phase:7.2f}°"
     )
     print(
-        f"{idx:6d}, {F:12.3f}, {abs(Z):12.5g}, {np.angle(Z,deg=True):9.3f}, "
-        f"{GdB:9.3f}, {Phase:9.3f}",
+        f"{idx:6d}, {F:12.3f}, {Zm:12.5g}, {Zph:9.3f}, {GdB:9.3f}, {Phase:9.3f}",
         file=log,
     )
 
-    VNA.append((F, GdB, Phase, Z))
+    VNA_F[VNA_N], VNA_dB[VNA_N], VNA_Ph[VNA_N], VNA_Z[VNA_N] = F, GdB, Phase, Z
+    VNA_N += 1
 
 log.close()
+GEN.shutdown(wait=True)
 rtb.close()
 rm.close()
 print("Done. Log saved to", FILEPREFIX + "_VNA.log")
 
 # ========= Plots =========
-if PlotOK and VNA:
-    F = np.array([x[0] for x in VNA])
-    Zm = np.array([abs(x[3]) for x in VNA])
-    Zph = np.array([np.angle(x[3], deg=True) for x in VNA])
-    GdB = np.array([x[1] for x in VNA])
-    Ph = np.array([x[2] for x in VNA])
+if PlotOK and VNA_N:
+    F = VNA_F[:VNA_N]
+    Zm = np.abs(VNA_Z[:VNA_N])
+    Zph = np.angle(VNA_Z[:VNA_N], deg=True)
+    GdB = VNA_dB[:VNA_N]
+    Ph = VNA_Ph[:VNA_N]
 
     fig, ax1 = plt.subplots()
     ax1.set_title("|Z| and ∠Z vs Frequency")
@@ -1,24 +1,54 @@
 #!/usr/bin/env python3
 # Control OWON AG1022 over USB (libusbK/WinUSB) with PyUSB, using SCPI
-import time
+import time, threading
 import usb.core, usb.util
 
 VID, PID = 0x5345, 0x1234  # OWON AG series
 
 
 class AG1022USB:
+    # One open handle per (vid, pid) for the life of the process: constructing
+    # the class again (e.g. re-running a notebook cell) skips the bus scan,
+    # set_configuration and endpoint search.
+    _handles = {}
+    _opc = {}  # (vid, pid) -> *OPC? answered when the handle was first opened
+    _handles_lock = threading.Lock()
+
     def __init__(self, vid=VID, pid=PID, timeout_ms=2000):
-        self.dev = usb.core.find(idVendor=vid, idProduct=pid)
-        if self.dev is None:
+        self.timeout = timeout_ms
+        with AG1022USB._handles_lock:
+            new = (vid, pid) not in AG1022USB._handles
+            if new:
+                # the last ON/OFF sent per channel lives with the handle, so
+                # every wrapper on the device sees the same output state
+                AG1022USB._handles[(vid, pid)] = self._connect(vid, pid) + ({},)
+            (
+                self.dev,
+                self.intf,
+                self.ep_out,
+                self.ep_in,
+                self._out,
+            ) = AG1022USB._handles[(vid, pid)]
+            # probed once per handle, not per wrapper: *CLS would hit a device
+            # another wrapper may be driving
+            if new and self.use_opc_sync:
+                self._probe_opc()
+            self.use_opc_sync = AG1022USB._opc.setdefault((vid, pid), self.use_opc_sync)
+
+    @staticmethod
+    def _connect(vid, pid):
+        dev = usb.core.find(idVendor=vid, idProduct=pid)
+        if dev is None:
             raise RuntimeError(
                 "AG1022 not found over USB (check driver/cable and close OWON software)."
             )
-        self.timeout = timeout_ms
 
         # Configure and locate a BULK OUT/IN pair
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
-        self.intf, self.ep_out, self.ep_in = None, None, None
+        try:
+            cfg = dev.get_active_configuration()
+        except usb.core.USBError:
+            dev.set_configuration()
+            cfg = dev.get_active_configuration()
 
         for intf in cfg:
             eps_out = [
@@ -38,42 +68,81 @@ class AG1022USB:
                 == usb.util.ENDPOINT_IN
             ]
             if eps_out and eps_in:
-                self.intf, self.ep_out, self.ep_in = intf, eps_out[0], eps_in[0]
-                break
+                usb.util.claim_interface(dev, intf.bInterfaceNumber)
+                return dev, intf, eps_out[0], eps_in[0]
 
-        if self.intf is None:
-            raise RuntimeError(
-                "No BULK endpoints found on AG1022 interface (driver must be libusbK/WinUSB)."
-            )
+        raise RuntimeError(
+            "No BULK endpoints found on AG1022 interface (driver must be libusbK/WinUSB)."
+        )
 
-        usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
+    # Wait on *OPC? (answers once the command has been executed) instead of a
+    # fixed pause per write; _probe_opc turns it off if *OPC? goes unanswered.
+    use_opc_sync = True
 
     # --- low-level I/O ---
     def _write(self, cmd: str, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (cmd + "\n").encode("ascii"),
-            timeout=self.timeout,
-        )
-        time.sleep(pause)
+        self.ep_out.write((cmd + "\n").encode("ascii"), timeout=self.timeout)
+        if pause:
+            time.sleep(pause)
+
+    def _drain(self, tries=8):
+        for _ in range(tries):
+            try:
+                self.ep_in.read(512, timeout=20)
+            except usb.core.USBError:
+                break
+
+    def _read_opc(self, timeout):
+        # '->' and the *OPC? '1' can come as two packets; stop at the '1'
+        data = bytearray()
+        while not data.rstrip().endswith(b"1"):
+            try:
+                data += self.ep_in.read(512, timeout=timeout)
+            except usb.core.USBError:
+                if not data:
+                    raise
+                break
+        return data
+
+    def _probe_opc(self):
+        # the compound form write() uses; unanswered means paced writes
+        try:
+            self._write("*CLS;*OPC?", pause=0)
+            ok = self._read_opc(500).rstrip().endswith(b"1")
+        except usb.core.USBError:
+            ok = False
+        if not ok:
+            self._drain()
+            self.use_opc_sync = False
 
     def query(self, cmd: str) -> str:
-        self._write(cmd)
-        time.sleep(0.05)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=self.timeout)
+        # the blocking read returns as soon as the reply lands; no fixed pause
+        self._write(cmd, pause=0)
+        data = self.ep_in.read(512, timeout=self.timeout)
         return bytes(data).decode("ascii", errors="ignore").strip()
 
     def write(self, cmd: str):
         # many OWON set-commands reply with '->', errors with '=?' or 'NULL'
-        self._write(cmd)
+        if self.use_opc_sync:
+            # command and *OPC? in one transfer; the reply comes when it is done
+            self._write(f"{cmd};*OPC?", pause=0)
+        else:
+            self._write(cmd)
         try:
-            data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=50)
+            if self.use_opc_sync:
+                data = self._read_opc(self.timeout)
+            else:
+                data = self.ep_in.read(512, timeout=50)
             ack = bytes(data).decode("ascii", errors="ignore").strip()
             if "=?".encode() in data or "NULL".encode() in data:
                 raise RuntimeError(f"SCPI error for '{cmd}': {ack}")
         except usb.core.USBError:
             pass  # some set commands return nothing immediately
 
+    def write_batch(self, cmds):
+        for cmd in cmds:
+            self.write(cmd)
+
     # --- convenience / SCPI helpers ---
     def idn(self):
         return self.query("*IDN?")
@@ -83,24 +152,37 @@ class AG1022USB:
 
     def rst(self):
         self.write("*RST")
-        time.sleep(0.2)
+        self._out.clear()
+        if not self.use_opc_sync:
+            time.sleep(0.2)
 
     def select_channel(self, ch: int):
         assert ch in (1, 2)
         self.write(f":CHAN CH{ch}")
 
-    def output(self, ch: int, on=True):
+    def output(self, ch: int, on=True, force=False):
+        # re-sending the state already in force costs a write, pause and ACK
+        # read for nothing; force=True re-transmits anyway
+        on = bool(on)
+        if not force and self._out.get(ch) is on:
+            return
         self.write(f":CHAN:CH{ch} {'ON' if on else 'OFF'}")
+        self._out[ch] = on
 
     def set_sine(
         self, ch: int, freq_hz: float, vpp: float, offset_v: float = 0.0, load="OFF"
     ):
-        self.select_channel(ch)
-        self.write(":FUNC SINE")
-        self.write(f":FUNC:SINE:LOAD {load}")
-        self.write(f":FUNC:SINE:FREQ {freq_hz}")
-        self.write(f":FUNC:SINE:AMPL {vpp}")
-        self.write(f":FUNC:SINE:OFFS {offset_v}")
+        assert ch in (1, 2)
+        self.write_batch(
+            [
+                f":CHAN CH{ch}",
+                ":FUNC SINE",
+                f":FUNC:SINE:LOAD {load}",
+                f":FUNC:SINE:FREQ {freq_hz}",
+                f":FUNC:SINE:AMPL {vpp}",
+                f":FUNC:SINE:OFFS {offset_v}",
+            ]
+        )
 
     def set_square(
         self,
@@ -111,13 +193,18 @@ class AG1022USB:
         duty_pct: float = 50,
         load="OFF",
     ):
-        self.select_channel(ch)
-        self.write(":FUNC SQU")
-        self.write(f":FUNC:SQU:LOAD {load}")
-        self.write(f":FUNC:SQU:FREQ {freq_hz}")
-        self.write(f":FUNC:SQU:AMPL {vpp}")
-        self.write(f":FUNC:SQU:OFFS {offset_v}")
-        self.write(f":FUNC:SQU:DCYC {duty_pct}")
+        assert ch in (1, 2)
+        self.write_batch(
+            [
+                f":CHAN CH{ch}",
+                ":FUNC SQU",
+                f":FUNC:SQU:LOAD {load}",
+                f":FUNC:SQU:FREQ {freq_hz}",
+                f":FUNC:SQU:AMPL {vpp}",
+                f":FUNC:SQU:OFFS {offset_v}",
+                f":FUNC:SQU:DCYC {duty_pct}",
+            ]
+        )
 
     def set_ramp(
         self,
@@ -128,13 +215,18 @@ class AG1022USB:
         symmetry_pct: float = 50,
         load="OFF",
     ):
-        self.select_channel(ch)
-        self.write(":FUNC RAMP")
-        self.write(f":FUNC:RAMP:LOAD {load}")
-        self.write(f":FUNC:RAMP:FREQ {freq_hz}")
-        self.write(f":FUNC:RAMP:AMPL {vpp}")
-        self.write(f":FUNC:RAMP:OFFS {offset_v}")
-        self.write(f":FUNC:RAMP:SYMM {symmetry_pct}")
+        assert ch in (1, 2)
+        self.write_batch(
+            [
+                f":CHAN CH{ch}",
+                ":FUNC RAMP",
+                f":FUNC:RAMP:LOAD {load}",
+                f":FUNC:RAMP:FREQ {freq_hz}",
+                f":FUNC:RAMP:AMPL {vpp}",
+                f":FUNC:RAMP:OFFS {offset_v}",
+                f":FUNC:RAMP:SYMM {symmetry_pct}",
+            ]
+        )
 
     # queries
     def q_wave(self):
@@ -4,12 +4,16 @@
 #            freq <value>  ampl <vpp>  offs <v>  duty <pct>  symm <pct>  load <OFF|50|100>
 #            get [freq|ampl|offs|wave]  sweep <start> <stop> <points> [lin|log] [dwell_s]
 #            presets  status  quit
+# Piped/scripted input (stdin not a terminal, or AG1022_NONINTERACTIVE=1):
+#   no prompt or help banner, sweeps default to no dwell, and the exit status
+#   is 1 if any command failed.
 
 
-import re, sys, time
+import math, os, re, sys, time
 import usb.core, usb.util
 
 VID, PID = 0x5345, 0x1234  # OWON
+INTERACTIVE = sys.stdin.isatty() and not os.environ.get("AG1022_NONINTERACTIVE")
 
 
 def parse_number(token: str) -> float:
@@ -48,15 +52,45 @@ def fmt_v(x: float) -> str:
 
 
 class AG1022USB:
+    # Lookup tables built once at class creation, not on every call
+    WAVES = {
+        "SINE": "SINE",
+        "SIN": "SINE",
+        "SQU": "SQU",
+        "SQUARE": "SQU",
+        "RAMP": "RAMP",
+        "TRI": "RAMP",
+        "DC": "DC",
+    }
+    LOADS = frozenset(("OFF", "50", "100"))
+    # closed sets of commands, spelled out once instead of formatted per call
+    WAVE_CMDS = {k: f":FUNC {v}" for k, v in WAVES.items()}
+    CH_CMDS = {1: ":CHAN CH1", 2: ":CHAN CH2"}
+    OUT_CMDS = {
+        (1, True): ":CHAN:CH1 ON",
+        (1, False): ":CHAN:CH1 OFF",
+        (2, True): ":CHAN:CH2 ON",
+        (2, False): ":CHAN:CH2 OFF",
+    }
+
     def __init__(self, vid=VID, pid=PID, timeout_ms=2000):
-        self.dev = usb.core.find(idVendor=vid, idProduct=pid)
+        # one bus walk, narrowed by vendor ID from the cached device descriptors
+        # only (no per-device string reads); it serves both the PID match and
+        # the error message, instead of enumerating again on a miss
+        owon = list(usb.core.find(find_all=True, idVendor=vid))
+        self.dev = next((d for d in owon if d.idProduct == pid), None)
         if self.dev is None:
+            others = ", ".join(f"{d.idVendor:04x}:{d.idProduct:04x}" for d in owon)
             raise RuntimeError(
                 "AG1022 not found over USB. Check cable/driver and CLOSE OWON Waveform."
+                + (f" Other OWON devices: {others}" if others else "")
             )
         self.timeout = timeout_ms
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         self.intf = self.ep_out = self.ep_in = None
         for intf in cfg:
             outs = [
@@ -84,31 +118,74 @@ class AG1022USB:
             )
         usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
         self.current_ch = 1  # track selected channel for convenience
+        if self.use_opc_sync:
+            self._probe_opc()
+
+    # Wait on *OPC? (answers once the command has been executed) instead of a
+    # fixed pause per write; _probe_opc turns it off if *OPC? goes unanswered.
+    use_opc_sync = True
 
     # --- low-level ---
-    def _write(self, scpi: str, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (scpi + "\n").encode("ascii"),
-            timeout=self.timeout,
-        )
-        time.sleep(pause)
+    def _write(self, scpi: str, pause=0.0):
+        self.ep_out.write((scpi + "\n").encode("ascii"), timeout=self.timeout)
+        if pause:
+            time.sleep(pause)
+
+    def _drain(self, tries=8):
+        for _ in range(tries):
+            try:
+                self.ep_in.read(512, timeout=20)
+            except usb.core.USBError:
+                break
+
+    def _read_opc(self, timeout):
+        # keep reading past a separate '->' packet until the '1' is in
+        data = bytearray()
+        while not data.rstrip().endswith(b"1"):
+            try:
+                data += self.ep_in.read(512, timeout=timeout)
+            except usb.core.USBError:
+                if not data:
+                    raise
+                break
+        return data
+
+    def _probe_opc(self):
+        # *OPC? chained like write() sends it; fall back to pacing if unanswered
+        try:
+            self._write("*CLS;*OPC?")
+            ok = self._read_opc(500).rstrip().endswith(b"1")
+        except usb.core.USBError:
+            ok = False
+        if not ok:
+            self._drain()
+            self.use_opc_sync = False
 
     def write(self, scpi: str):
-        self._write(scpi)
+        if self.use_opc_sync:
+            # command and *OPC? in one transfer; the reply comes back when done
+            self._write(f"{scpi};*OPC?")
+        else:
+            self._write(scpi, pause=0.03)
         # Some set-commands echo '->' (OK) or '=?'/'NULL' (error). Try to read a short ack; ignore if timeout.
         try:
-            data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=50)
+            if self.use_opc_sync:
+                data = self._read_opc(self.timeout)
+            else:
+                data = self.ep_in.read(512, timeout=50)
             ack = bytes(data).decode("ascii", "ignore").strip()
             if "=?".encode() in data or "NULL".encode() in data:
                 raise RuntimeError(f"SCPI error for '{scpi}': {ack}")
         except usb.core.USBError:
             pass
 
+    def write_batch(self, cmds):
+        for scpi in cmds:
+            self.write(scpi)
+
     def query(self, scpi: str) -> str:
         self._write(scpi)
-        time.sleep(0.05)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=self.timeout)
+        data = self.ep_in.read(512, timeout=self.timeout)
         return bytes(data).decode("ascii", "ignore").strip()
 
     # --- convenience ---
@@ -120,31 +197,23 @@ class AG1022USB:
 
     def rst(self):
         self.write("*RST")
-        time.sleep(0.2)
+        if not self.use_opc_sync:
+            time.sleep(0.2)
 
     def ch(self, ch: int):
         if ch not in (1, 2):
             raise ValueError("Channel must be 1 or 2.")
-        self.write(f":CHAN CH{ch}")
+        self.write(self.CH_CMDS[ch])
         self.current_ch = ch
 
     def out(self, ch: int, on: bool = True):
-        self.write(f":CHAN:CH{ch} {'ON' if on else 'OFF'}")
+        self.write(self.OUT_CMDS[ch, bool(on)])
 
     def wave(self, kind: str):
         k = kind.strip().upper()
-        mp = {
-            "SINE": "SINE",
-            "SIN": "SINE",
-            "SQU": "SQU",
-            "SQUARE": "SQU",
-            "RAMP": "RAMP",
-            "TRI": "RAMP",
-            "DC": "DC",
-        }
-        if k not in mp:
+        if k not in self.WAVE_CMDS:
             raise ValueError("Wave must be sine/square/ramp/dc.")
-        self.write(f":FUNC {mp[k]}")
+        self.write(self.WAVE_CMDS[k])
 
     def freq(self, wave: str, hz: float):
         self.write(f":FUNC:{wave}:FREQ {hz}")
@@ -164,6 +233,21 @@ class AG1022USB:
     def load(self, wave: str, val: str):
         self.write(f":FUNC:{wave}:LOAD {val}")
 
+    def sweep(self, wave: str, freqs, dwell=0.0, on_step=None):
+        """Step the selected channel through freqs with one FREQ write per point.
+
+        Output is switched on once, after the first frequency is set;
+        on_step(f) is called as each point takes effect, before the dwell.
+        """
+        for i, f in enumerate(freqs):
+            self.freq(wave, f)
+            if i == 0:
+                self.out(self.current_ch, True)
+            if on_step:
+                on_step(f)
+            if dwell:
+                time.sleep(dwell)
+
     def get_wave(self):
         return self.query(":FUNC?")
 
@@ -176,6 +260,17 @@ class AG1022USB:
     def get_offs(self, wave: str):
         return self.query(f":FUNC:{wave}:OFFS?")
 
+    def get_params(self, wave: str):
+        """FREQ/AMPL/OFFS of ``wave`` in one compound query round trip"""
+        base = f":FUNC:{wave}"
+        parts = self.query(f"{base}:FREQ?;{base}:AMPL?;{base}:OFFS?").split(";")
+        if len(parts) != 3:
+            # firmware that answers each sub-query in its own packet: drop
+            # the ones still queued, then ask field by field
+            self._drain()
+            return self.get_freq(wave), self.get_ampl(wave), self.get_offs(wave)
+        return tuple(p.strip() for p in parts)
+
 
 def print_help():
     print(
@@ -217,11 +312,13 @@ def main():
         sys.exit(1)
 
     print(f"Connected: {gen.idn()}")
-    print_help()
+    if INTERACTIVE:
+        print_help()
+    failed = False
     wave_for_query = {"SINE": "SINE", "SQU": "SQU", "RAMP": "RAMP", "DC": "DC"}
 
-    def current_wave_key():
-        w = gen.get_wave().strip().upper()
+    def current_wave_key(w=None):
+        w = (gen.get_wave() if w is None else w).strip().upper()
         return (
             "SQU"
             if "SQU" in w or "SQUARE" in w
@@ -232,7 +329,7 @@ def main():
 
     while True:
         try:
-            raw = input(f"[CH{gen.current_ch}] > ").strip()
+            raw = input(f"[CH{gen.current_ch}] > " if INTERACTIVE else "").strip()
         except (EOFError, KeyboardInterrupt):
             print("\nbye.")
             break
@@ -277,7 +374,7 @@ def main():
                 gen.symm(float(args[1]))
             elif cmd == "load":
                 val = args[1].upper()
-                if val not in ("OFF", "50", "100"):
+                if val not in gen.LOADS:
                     raise ValueError("load must be OFF, 50, or 100")
                 w = current_wave_key()
                 gen.load(w, val)
@@ -297,11 +394,12 @@ def main():
                     print("unknown get field (use wave|freq|ampl|offs)")
 
             elif cmd == "status":
-                w = current_wave_key()
-                print("wave:", gen.get_wave())
-                print("freq:", gen.get_freq(w))
-                print("ampl:", gen.get_ampl(w))
-                print("offs:", gen.get_offs(w))
+                wave = gen.get_wave()
+                freq, ampl, offs = gen.get_params(current_wave_key(wave))
+                print("wave:", wave)
+                print("freq:", freq)
+                print("ampl:", ampl)
+                print("offs:", offs)
 
             elif cmd == "presets":
                 print("Examples:")
@@ -316,25 +414,27 @@ def main():
                 stop = parse_number(args[2])
                 pts = int(args[3])
                 mode = args[4].lower() if len(args) > 4 else "lin"
-                dwell = float(args[5]) if len(args) > 5 else 1.0
+                if len(args) > 5:
+                    dwell = float(args[5])
+                else:
+                    dwell = 1.0 if INTERACTIVE else 0.0
                 if pts < 2:
                     raise ValueError("points must be >= 2")
                 w = current_wave_key()
                 freqs = []
                 if mode.startswith("log"):
-                    import math
-
-                    a, b = math.log10(start), math.log10(stop)
-                    freqs = [10 ** (a + i * (b - a) / (pts - 1)) for i in range(pts)]
+                    # each point from its own exponent (a repeated ratio drifts),
+                    # and the last one is exactly stop
+                    span = math.log10(stop / start)
+                    freqs = [start * 10 ** (span * i / (pts - 1)) for i in range(pts)]
+                    freqs[-1] = stop
                 else:
                     step = (stop - start) / (pts - 1)
                     freqs = [start + i * step for i in range(pts)]
                 gen.out(gen.current_ch, False)
-                for f in freqs:
-                    gen.freq(w, f)
-                    gen.out(gen.current_ch, True)
-                    print(f" -> {fmt_hz(f)}")
-                    time.sleep(dwell)
+                gen.sweep(
+                    w, freqs, dwell, on_step=lambda f: print(f" -> {fmt_hz(f)}")
+                )
                 print("sweep done.")
 
             else:
@@ -342,8 +442,11 @@ def main():
 
         except Exception as e:
             print("ERR:", e)
+            failed = True
 
     print("Done.")
+    if failed and not INTERACTIVE:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,28 +1,29 @@
 # pip install pyvisa
 # This code is used to find the RTB and print the IDN
 
+import re
 import pyvisa
 
 rm = pyvisa.ResourceManager()  # uses the system’s default VISA (R&S/NI/Keysight)
-print("Found:", rm.list_resources())
-inst = rm.open_resource(
-    next(
-        r
-        for r in rm.list_resources()
-        if "RTB" in r or "0x0AAD" in r or r.startswith("TCPIP0::")
-    )
-)
+resources = rm.list_resources()
+print("Found:", resources)
+# short *IDN? timeout: a scope that does not answer fails after a second
+# instead of the multi-second VISA default
+SCOPE = re.compile(r"RTB|0x0AAD|^TCPIP0::")  # model, R&S VID, or any LAN instrument
+inst = rm.open_resource(next(r for r in resources if SCOPE.search(r)))
 inst.read_termination = "\n"
 inst.write_termination = "\n"
-inst.timeout = 5000
+inst.timeout = 1000
 print("IDN:", inst.query("*IDN?"))
+inst.timeout = 5000
 
 
 ########### The code below is used to get the data from the RTB and print the first 5 samples to verify the connection
 import pyvisa, numpy as np
 
 RES = "USB0::0x0AAD::0x01D6::203356::INSTR"  # your scope
-rm = pyvisa.ResourceManager()
+# same ResourceManager as above: VISA session start-up is paid once per run
+inst.close()
 rtb = rm.open_resource(RES)
 rtb.read_termination = "\n"
 rtb.write_termination = "\n"
@@ -40,14 +41,12 @@ y = rtb.query_binary_values("CHAN1:DATA?", datatype="f", is_big_endian=False)
 print("Samples:", len(y), "First 5:", y[:5])
 
 rtb.close()
-rm.close()
 
 
 import pyvisa, numpy as np
 
 RES = "USB0::0x0AAD::0x01D6::203356::INSTR"  # your RTB resource
-rm = pyvisa.ResourceManager()
-rtb = rm.open_resource(RES)
+rtb = rm.open_resource(RES)  # still the one ResourceManager
 rtb.timeout = 30000
 rtb.chunk_size = 1024 * 1024
 rtb.write("SYST:HEAD OFF; HIST:STAT OFF; ACQ:AVER:STAT OFF; ACQ:STOPA SEQ")
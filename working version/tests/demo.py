@@ -65,6 +65,28 @@ def fmt_v(x: float) -> str:
 
 
 class AG1022USB:
+    # Lookup tables built once at class creation, not on every call
+    WAVES = {
+        "SINE": "SINE",
+        "SIN": "SINE",
+        "SQU": "SQU",
+        "SQUARE": "SQU",
+        "RAMP": "RAMP",
+        "TRI": "RAMP",
+        "DC": "DC",
+    }
+    LOADS = frozenset(("OFF", "50", "100"))
+    # closed sets of commands, spelled out once instead of formatted per call
+    WAVE_CMDS = {k: f":FUNC {v}" for k, v in WAVES.items()}
+    CH_CMDS = {1: ":CHAN CH1", 2: ":CHAN CH2"}
+    OUT_CMDS = {
+        (1, True): ":CHAN:CH1 ON",
+        (1, False): ":CHAN:CH1 OFF",
+        (2, True): ":CHAN:CH2 ON",
+        (2, False): ":CHAN:CH2 OFF",
+    }
+    PCT_RANGE = (0.0, 100.0)  # duty / symmetry limits, %
+
     def __init__(self, vid=VID, pid=PID, timeout_ms=2000):
         self.dev = usb.core.find(idVendor=vid, idProduct=pid)
         if self.dev is None:
@@ -72,8 +94,11 @@ class AG1022USB:
                 "AG1022 not found over USB. Check cable/driver and CLOSE OWON Waveform."
             )
         self.timeout = timeout_ms
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         self.intf = self.ep_out = self.ep_in = None
         for intf in cfg:
             outs = [
@@ -101,19 +126,60 @@ class AG1022USB:
             )
         usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
         self.current_ch = 1
+        self.output_on = {1: None, 2: None}  # last state set here; None = unknown
+        if self.use_opc_sync:
+            self._probe_opc()
+
+    # Wait on *OPC? (answers once the command has been executed) instead of a
+    # fixed pause per write; _probe_opc turns it off if *OPC? goes unanswered.
+    use_opc_sync = True
 
     def _write(self, scpi: str, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (scpi + "\n").encode("ascii"),
-            timeout=self.timeout,
-        )
-        time.sleep(pause)
+        self.ep_out.write((scpi + "\n").encode("ascii"), timeout=self.timeout)
+        if pause:
+            time.sleep(pause)
+
+    def _drain(self, tries=8):
+        for _ in range(tries):
+            try:
+                self.ep_in.read(512, timeout=20)
+            except usb.core.USBError:
+                break
+
+    def _read_opc(self, timeout):
+        # the set command's ACK may precede the '1' in its own packet
+        data = bytearray()
+        while not data.rstrip().endswith(b"1"):
+            try:
+                data += self.ep_in.read(512, timeout=timeout)
+            except usb.core.USBError:
+                if not data:
+                    raise
+                break
+        return data
+
+    def _probe_opc(self):
+        # same compound form as write(); no '1' back -> paced writes instead
+        try:
+            self._write("*CLS;*OPC?", pause=0)
+            ok = self._read_opc(500).rstrip().endswith(b"1")
+        except usb.core.USBError:
+            ok = False
+        if not ok:
+            self._drain()
+            self.use_opc_sync = False
 
     def write(self, scpi: str):
-        self._write(scpi)
+        if self.use_opc_sync:
+            # command and *OPC? in one transfer; the reply comes when it is done
+            self._write(f"{scpi};*OPC?", pause=0)
+        else:
+            self._write(scpi)
         try:
-            data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=50)
+            if self.use_opc_sync:
+                data = self._read_opc(self.timeout)
+            else:
+                data = self.ep_in.read(512, timeout=50)
             ack = bytes(data).decode("ascii", "ignore").strip()
             if "=?".encode() in data or "NULL".encode() in data:
                 raise RuntimeError(f"SCPI error for '{scpi}': {ack}")
@@ -121,9 +187,9 @@ class AG1022USB:
             pass
 
     def query(self, scpi: str) -> str:
-        self._write(scpi)
-        time.sleep(0.05)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=self.timeout)
+        # the blocking read returns as soon as the reply lands; no fixed pause
+        self._write(scpi, pause=0)
+        data = self.ep_in.read(512, timeout=self.timeout)
         return bytes(data).decode("ascii", "ignore").strip()
 
     def idn(self):
@@ -134,31 +200,25 @@ class AG1022USB:
 
     def rst(self):
         self.write("*RST")
-        time.sleep(0.2)
+        self.output_on = {1: None, 2: None}
+        if not self.use_opc_sync:
+            time.sleep(0.2)
 
     def ch(self, ch: int):
         if ch not in (1, 2):
             raise ValueError("Channel must be 1 or 2.")
-        self.write(f":CHAN CH{ch}")
+        self.write(self.CH_CMDS[ch])
         self.current_ch = ch
 
     def out(self, ch: int, on: bool = True):
-        self.write(f":CHAN:CH{ch} {'ON' if on else 'OFF'}")
+        self.write(self.OUT_CMDS[ch, bool(on)])
+        self.output_on[ch] = on
 
     def wave(self, kind: str):
         k = kind.strip().upper()
-        mp = {
-            "SINE": "SINE",
-            "SIN": "SINE",
-            "SQU": "SQU",
-            "SQUARE": "SQU",
-            "RAMP": "RAMP",
-            "TRI": "RAMP",
-            "DC": "DC",
-        }
-        if k not in mp:
+        if k not in self.WAVE_CMDS:
             raise ValueError("Wave must be sine/square/ramp/dc.")
-        self.write(f":FUNC {mp[k]}")
+        self.write(self.WAVE_CMDS[k])
 
     def freq(self, wave: str, hz: float):
         self.write(f":FUNC:{wave}:FREQ {hz}")
@@ -190,6 +250,17 @@ class AG1022USB:
     def get_offs(self, wave: str):
         return self.query(f":FUNC:{wave}:OFFS?")
 
+    def get_params(self, wave: str):
+        """FREQ/AMPL/OFFS of ``wave`` in one compound query round trip"""
+        base = f":FUNC:{wave}"
+        parts = self.query(f"{base}:FREQ?;{base}:AMPL?;{base}:OFFS?").split(";")
+        if len(parts) != 3:
+            # firmware that answers each sub-query in its own packet: drop
+            # the ones still queued, then ask field by field
+            self._drain()
+            return self.get_freq(wave), self.get_ampl(wave), self.get_offs(wave)
+        return tuple(p.strip() for p in parts)
+
     def get_status(self):
         """Get current status of the generator"""
         try:
@@ -204,9 +275,7 @@ class AG1022USB:
                 )
             )
 
-            freq = float(self.get_freq(wave_key))
-            ampl = float(self.get_ampl(wave_key))
-            offs = float(self.get_offs(wave_key))
+            freq, ampl, offs = map(float, self.get_params(wave_key))
 
             return {
                 "channel": self.current_ch,
@@ -522,7 +591,7 @@ def waveform_handler(gen):
 
             elif choice == "5":
                 duty = get_number_input("Enter duty cycle (0-100%): ")
-                if 0 <= duty <= 100:
+                if gen.PCT_RANGE[0] <= duty <= gen.PCT_RANGE[1]:
                     gen.duty(duty)
                     print(f"✓ Set duty cycle to {duty}%")
                 else:
@@ -530,7 +599,7 @@ def waveform_handler(gen):
 
             elif choice == "6":
                 symm = get_number_input("Enter symmetry (0-100%): ")
-                if 0 <= symm <= 100:
+                if gen.PCT_RANGE[0] <= symm <= gen.PCT_RANGE[1]:
                     gen.symm(symm)
                     print(f"✓ Set symmetry to {symm}%")
                 else:
@@ -538,7 +607,7 @@ def waveform_handler(gen):
 
             elif choice == "7":
                 load = get_user_input("Enter load impedance (OFF/50/100): ").upper()
-                if load in ["OFF", "50", "100"]:
+                if load in gen.LOADS:
                     status = gen.get_status()
                     if "error" not in status:
                         gen.load(status["wave_key"], load)
@@ -689,7 +758,7 @@ def advanced_handler(gen):
 
             elif choice == "3":
                 load = get_user_input("Enter load impedance (OFF/50/100): ").upper()
-                if load in ["OFF", "50", "100"]:
+                if load in gen.LOADS:
                     status = gen.get_status()
                     if "error" not in status:
                         gen.load(status["wave_key"], load)
@@ -825,10 +894,11 @@ def main():
             elif choice == "0":
                 print("\nShutting down generator...")
                 try:
-                    gen.out(1, False)
-                    gen.out(2, False)
-                except:
-                    pass
+                    for ch in (1, 2):
+                        if gen.output_on[ch] is not False:  # skip known-off
+                            gen.out(ch, False)
+                except (usb.core.USBError, RuntimeError) as e:
+                    print(f"Could not switch outputs off: {e}")
                 print("✓ Demo completed. Goodbye!")
                 break
             else:
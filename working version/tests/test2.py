@@ -6,7 +6,7 @@
 # - Plots commanded vs measured frequency (vs time) and measured Vpp (vs time)
 
 
-import time, math, re
+import time, math, re, os, json, asyncio, array
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -24,8 +24,11 @@ class AG1022USB:
                 "AG1022 not found over USB. Close OWON Waveform and check driver (libusbK/WinUSB)."
             )
         self.timeout = timeout_ms
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         self.intf = self.ep_out = self.ep_in = None
         for itf in cfg:
             outs = [
@@ -50,36 +53,48 @@ class AG1022USB:
         if not self.intf:
             raise RuntimeError("No BULK IN/OUT endpoints found on AG1022.")
         usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
+        # replies are read a packet at a time into one reused buffer
+        self._in_mps = self.ep_in.wMaxPacketSize
+        self._rx = array.array("B", bytes(self._in_mps))
+        self._rx_mv = memoryview(self._rx)
 
     def _write_raw(self, s, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (s + "\n").encode("ascii"),
-            timeout=self.timeout,
-        )
-        time.sleep(pause)
+        self.ep_out.write((s + "\n").encode("ascii"), timeout=self.timeout)
+        if pause:
+            time.sleep(pause)
 
     def drain(self):
         # swallow short '->' acks so the next query isn't polluted
         for _ in range(4):
             try:
-                _ = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=10)
+                _ = self.ep_in.read(512, timeout=10)
+            except usb.core.USBError:
+                break
+
+    def _read(self, timeout):
+        # one packet at a time; a short packet or a trailing LF ends the reply
+        n = self.ep_in.read(self._rx, timeout=timeout)
+        buf = bytearray(self._rx_mv[:n])
+        while n == self._in_mps and not buf.endswith(b"\n"):
+            try:
+                n = self.ep_in.read(self._rx, timeout=timeout)
             except usb.core.USBError:
                 break
+            buf += self._rx_mv[:n]
+        return buf.decode("ascii", "ignore").strip()
 
     def write(self, s):
         self._write_raw(s)
 
     def query(self, s):
         self.drain()
-        self._write_raw(s)
-        time.sleep(0.06)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 2048, timeout=self.timeout)
-        txt = bytes(data).decode("ascii", "ignore").strip()
+        # no settle pause: the blocking read below returns as soon as the reply
+        # (or a bare '->' ack, handled after) is there, instead of 90 ms later
+        self._write_raw(s, pause=0)
+        txt = self._read(self.timeout)
         if txt == "->":
             try:
-                data2 = self.dev.read(self.ep_in.bEndpointAddress, 4096, timeout=300)
-                t2 = bytes(data2).decode("ascii", "ignore").strip()
+                t2 = self._read(300)
                 if t2:
                     txt = t2
             except usb.core.USBError:
@@ -96,33 +111,92 @@ class AG1022USB:
     def out(self, n, on=True):
         self.write(f":CHAN:CH{1 if n==1 else 2} {'ON' if on else 'OFF'}")
 
+    def write_batch(self, cmds):
+        for s in cmds:
+            self.write(s)
+
     def set_sine(self, ch, f, vpp=1.0, offs=0.0, load="OFF"):
-        self.ch(ch)
-        self.write(":FUNC SINE")
-        self.write(f":FUNC:SINE:LOAD {load}")
-        self.write(f":FUNC:SINE:FREQ {f}")
-        self.write(f":FUNC:SINE:AMPL {vpp}")
-        self.write(f":FUNC:SINE:OFFS {offs}")
+        self.write_batch(
+            [
+                f":CHAN CH{1 if ch==1 else 2}",
+                ":FUNC SINE",
+                f":FUNC:SINE:LOAD {load}",
+                f":FUNC:SINE:FREQ {f}",
+                f":FUNC:SINE:AMPL {vpp}",
+                f":FUNC:SINE:OFFS {offs}",
+            ]
+        )
 
 
 # ==================== RTB2004 over VISA ====================
 import pyvisa
 
+# shared with vna_full.py: {"rtb": "<VISA resource string>"}
+CACHE_FILE = os.path.expanduser("~/.vna_cache.json")
 
-def open_rtb():
+
+def _load_cache():
     try:
-        rm = pyvisa.ResourceManager()
-    except Exception:
-        rm = pyvisa.ResourceManager("@py")
+        with open(CACHE_FILE) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    try:
+        with open(CACHE_FILE, "w") as fh:
+            json.dump(cache, fh)
+    except OSError:
+        pass  # caching is only an optimisation
+
+
+# model name, or an R&S (VID 0x0AAD) USB resource; one compiled pass per string
+RTB_RESOURCE = re.compile(r"RTB|USB\d*::0x0AAD::", re.I)
+
+
+def _find_rtb(rm):
+    # Last run's resource string first; list_resources() walks every bus
+    cache = _load_cache()
+    if cache.get("rtb"):
+        try:
+            return rm.open_resource(cache["rtb"])
+        except Exception:
+            pass  # gone or renumbered: fall back to enumeration
     res = rm.list_resources()
     cand = None
     for r in res:
-        if re.search(r"RTB|R&S.*RTB", r, re.I) or ("USB" in r and "0x0AAD" in r):
+        if RTB_RESOURCE.search(r):
             cand = r
             break
     if not cand:
         raise RuntimeError(f"RTB2004 not found. VISA resources: {res}")
     inst = rm.open_resource(cand)
+    cache["rtb"] = cand
+    _save_cache(cache)
+    return inst
+
+
+_RM = None
+
+
+def get_rm():
+    # one VISA session per process: viOpenDefaultRM can take seconds, so later
+    # open_rtb() calls reuse it (a fresh one only if it has been closed since)
+    global _RM
+    try:
+        _RM.session
+    except (AttributeError, pyvisa.errors.InvalidSession):
+        try:
+            _RM = pyvisa.ResourceManager()
+        except Exception:
+            _RM = pyvisa.ResourceManager("@py")
+    return _RM
+
+
+def open_rtb():
+    rm = get_rm()
+    inst = _find_rtb(rm)
     inst.timeout = 30000
     inst.chunk_size = 1024 * 1024
     inst.read_termination = "\n"
@@ -137,9 +211,7 @@ def open_rtb():
 def capture_ch1_block(rtb, f_hz, points=8000):
     """Single acquisition from CH1 with bounded points; binary with ASCII fallback."""
     # timebase ≈ 10 periods on screen for good zero-crossing
-    rtb.write(f"TIM:SCAL {1.0/f_hz/10.0:.9f}")
-    rtb.write("SING")
-    rtb.query("*OPC?")  # wait until captured
+    rtb.query(f"TIM:SCAL {1.0/f_hz/10.0:.9f}; SING; *OPC?")  # returns when captured
     rtb.write(f"CHAN1:DATA:POIN {points}")
 
     # header for dt
@@ -180,11 +252,36 @@ def capture_ch1_block(rtb, f_hz, points=8000):
         return y, dt
 
 
+async def _open_both():
+    # AG1022 (PyUSB) and RTB (VISA) share nothing, so both are opened and
+    # identified at once on worker threads; start-up is the slower of the two
+    def gen_up():
+        gen = AG1022USB()
+        return gen, gen.idn()
+
+    def rtb_up():
+        rm, rtb = open_rtb()
+        return rm, rtb, rtb.query("*IDN?").strip()
+
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        loop.run_in_executor(None, gen_up), loop.run_in_executor(None, rtb_up)
+    )
+
+
+def open_both():
+    """Open and identify AG1022 + RTB2004 concurrently; returns (gen, rm, rtb)."""
+    (gen, gen_idn), (rm, rtb, rtb_idn) = asyncio.run(_open_both())
+    print("AG:", gen_idn)
+    print("RTB:", rtb_idn)
+    return gen, rm, rtb
+
+
 # ==================== Measurements ====================
-def estimate_freq(y, dt):
-    """Zero-crossing with interpolation; FFT fallback."""
+def estimate_freq(y, dt, min_len=16):
+    """Zero-crossing with interpolation; FFT fallback. NaN below min_len samples."""
     y = np.asarray(y)
-    if len(y) < 16:
+    if len(y) < min_len:
         return float("nan")
     y = y - np.mean(y)
     s = np.signbit(y)
@@ -236,10 +333,7 @@ def main():
     freqs = [float(f) for f in freqs if f <= 25e6]
 
     # Open instruments
-    gen = AG1022USB()
-    print("AG:", gen.idn())
-    rm, rtb = open_rtb()
-    print("RTB:", rtb.query("*IDN?").strip())
+    gen, rm, rtb = open_both()
 
     # Configure AG CH1
     gen.out(1, False)
@@ -248,7 +342,17 @@ def main():
 
     # Sweep
     t0 = time.time()
-    rows = []  # (t, f_cmd, f_meas, vpp_meas, offset)
+    # one preallocated record per step instead of a growing list of tuples
+    rows = np.empty(
+        len(freqs),
+        dtype=[
+            ("t", "f8"),
+            ("f_cmd", "f8"),
+            ("f_meas", "f8"),
+            ("vpp", "f8"),
+            ("off", "f8"),
+        ],
+    )
 
     for i, f in enumerate(freqs, 1):
         # Program AG
@@ -260,7 +364,7 @@ def main():
         vpp, voff = measure_vpp_offset(y)
 
         t = time.time() - t0
-        rows.append((t, f, f_meas, vpp, voff))
+        rows[i - 1] = (t, f, f_meas, vpp, voff)
         print(
             f"[{i:02d}/{len(freqs)}] t={t:6.2f}s  f_cmd={f:10.1f} Hz  f_meas≈{f_meas:10.1f} Hz"
             f"  err={f_meas-f:+.1f} Hz  Vpp≈{vpp:.3f} V  Off≈{voff:+.3f} V"
@@ -271,19 +375,18 @@ def main():
     rm.close()
     gen.out(1, False)
 
-    # Convert to arrays
-    T = np.array([r[0] for r in rows])
-    F_c = np.array([r[1] for r in rows])
-    F_m = np.array([r[2] for r in rows])
-    Vpp = np.array([r[3] for r in rows])
+    # Column views of the record array (no copies)
+    T, F_c, F_m, Vpp = rows["t"], rows["f_cmd"], rows["f_meas"], rows["vpp"]
 
     # Print quick stats
     valid = np.isfinite(F_m)
     if np.any(valid):
         rel_err_ppm = 1e6 * (F_m[valid] - F_c[valid]) / F_c[valid]
+        i_min, i_max = int(rel_err_ppm.argmin()), int(rel_err_ppm.argmax())
         print(
             f"\nFreq error (median): {np.median(rel_err_ppm):.1f} ppm "
-            f"(min {np.min(rel_err_ppm):.1f} / max {np.max(rel_err_ppm):.1f} ppm)"
+            f"(min {rel_err_ppm[i_min]:.1f} @ {F_c[valid][i_min]:.1f} Hz / "
+            f"max {rel_err_ppm[i_max]:.1f} @ {F_c[valid][i_max]:.1f} Hz)"
         )
     else:
         print(
@@ -5,103 +5,195 @@ Computes CH2/CH1 gain & phase vs frequency and (optionally) impedance via -z.
 Flags (like your original):
   -b <BeginF>  -e <EndF>  -p <Pts/Dec>  -s <StepHz>
   -f <FILE_Prefix>  -n (no plots)  -q (square instead of sine)  -v <Vpp>  -z <R_sense>
+  -u <VID:PID>  AG1022 USB IDs in hex (default: last working pair, else 5345:1234)
 """
 
-import sys, os, re, time, math
+import sys, os, re, time, math, threading, argparse, json, array
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt
+
+try:
+    from numba import njit  # optional: compiles demod() to one fused pass
+except ImportError:
+    njit = None
 
 # -------------------- OWON AG1022 over PyUSB --------------------
 import usb.core, usb.util
 
 VID_OWON, PID_OWON = 0x5345, 0x1234
 
+# Channel/output commands spelled out once instead of formatted per call
+_CHAN_CMD = {1: ":CHAN CH1", 2: ":CHAN CH2"}
+_OUT_CMD = {
+    (1, True): ":CHAN:CH1 ON",
+    (1, False): ":CHAN:CH1 OFF",
+    (2, True): ":CHAN:CH2 ON",
+    (2, False): ":CHAN:CH2 OFF",
+}
+
+# (vid, pid) -> (dev, intf, ep_out, ep_in, io_lock); reopening skips enumeration
+_USB_CACHE = {}
+
+
+def _bulk_ep(intf, direction):
+    return usb.util.find_descriptor(
+        intf,
+        custom_match=lambda ep: usb.util.endpoint_type(ep.bmAttributes)
+        == usb.util.ENDPOINT_TYPE_BULK
+        and usb.util.endpoint_direction(ep.bEndpointAddress) == direction,
+    )
+
 
 class AG1022USB:
     def __init__(self, vid=VID_OWON, pid=PID_OWON, timeout_ms=2000):
-        self.dev = usb.core.find(idVendor=vid, idProduct=pid)
+        self.timeout = timeout_ms
+        if (vid, pid) not in _USB_CACHE:
+            self._open(vid, pid)
+        self.dev, self.intf, self.ep_out, self.ep_in, self._io_lock = _USB_CACHE[
+            (vid, pid)
+        ]
+        # RX buffer allocated once; pyusb reads into an array.array in place
+        # (returns the byte count) instead of allocating one per ACK/reply.
+        # Only touched under _io_lock.
+        self._rx = array.array("B", bytes(512))
+        # last full setup sent by set_sine/set_square, and its frequency
+        self._setup = self._freq = None
+
+    def _open(self, vid, pid):
+        # vendor ID first, from the cached device descriptors only: hubs,
+        # keyboards etc. are dropped without any string descriptor reads, and
+        # the same short list serves the PID match and the error message
+        owon = list(usb.core.find(find_all=True, idVendor=vid))
+        self.dev = next((d for d in owon if d.idProduct == pid), None)
         if self.dev is None:
+            others = ", ".join(f"{d.idVendor:04x}:{d.idProduct:04x}" for d in owon)
             raise RuntimeError(
                 "AG1022 not found over USB. Check cable/driver and close OWON Waveform."
+                + (f" Other OWON devices: {others}" if others else "")
             )
-        self.timeout = timeout_ms
-        self.dev.set_configuration()
-        cfg = self.dev.get_active_configuration()
+        # SET_CONFIGURATION only when the device is still unconfigured; the
+        # control transfer is skipped (and endpoint state kept) otherwise
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         self.intf = self.ep_out = self.ep_in = None
         for intf in cfg:
-            outs = [
-                ep
-                for ep in intf
-                if usb.util.endpoint_type(ep.bmAttributes)
-                == usb.util.ENDPOINT_TYPE_BULK
-                and usb.util.endpoint_direction(ep.bEndpointAddress)
-                == usb.util.ENDPOINT_OUT
-            ]
-            ins = [
-                ep
-                for ep in intf
-                if usb.util.endpoint_type(ep.bmAttributes)
-                == usb.util.ENDPOINT_TYPE_BULK
-                and usb.util.endpoint_direction(ep.bEndpointAddress)
-                == usb.util.ENDPOINT_IN
-            ]
-            if outs and ins:
-                self.intf, self.ep_out, self.ep_in = intf, outs[0], ins[0]
+            ep_out = _bulk_ep(intf, usb.util.ENDPOINT_OUT)
+            ep_in = _bulk_ep(intf, usb.util.ENDPOINT_IN)
+            if ep_out is not None and ep_in is not None:
+                self.intf, self.ep_out, self.ep_in = intf, ep_out, ep_in
                 break
         if not self.intf:
             raise RuntimeError(
                 "No BULK endpoints found. Driver must be libusbK/WinUSB."
             )
         usb.util.claim_interface(self.dev, self.intf.bInterfaceNumber)
-
-    def _write(self, scpi, pause=0.03):
-        self.dev.write(
-            self.ep_out.bEndpointAddress,
-            (scpi + "\n").encode("ascii"),
-            timeout=self.timeout,
+        # pyusb handles are not safe for concurrent IN/OUT from several threads
+        # (the sweep retunes from a worker); one re-entrant lock per device
+        # keeps each command + its ACK/reply together
+        _USB_CACHE[(vid, pid)] = (
+            self.dev,
+            self.intf,
+            self.ep_out,
+            self.ep_in,
+            threading.RLock(),
         )
-        time.sleep(pause)
 
-    def write(self, scpi):
-        self._write(scpi)
-        # ignore short ACK if none
-        try:
-            self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=20)
-        except usb.core.USBError:
-            pass
+    def _send(self, payload, pause=0.0):
+        # the bulk OUT returning means the unit took the command; only sleep
+        # when a caller knows the firmware needs settling time afterwards
+        self.ep_out.write(payload, timeout=self.timeout)
+        if pause:
+            time.sleep(pause)
+
+    def _write(self, scpi, pause=0.0):
+        self._send((scpi + "\n").encode("ascii"), pause)
+
+    def write(self, scpi, settle=0.03):
+        with self._io_lock:
+            self._write(scpi, pause=settle)
+            # ignore short ACK if none
+            try:
+                self.ep_in.read(self._rx, timeout=20)
+            except usb.core.USBError:
+                pass
+
+    def write_batch(self, cmds):
+        """Send several commands in order, each paced like write(), under one
+        hold of the I/O lock so a retune from the sweep worker can't interleave."""
+        with self._io_lock:
+            for scpi in cmds:
+                self.write(scpi)
 
     def query(self, scpi):
-        self._write(scpi)
-        time.sleep(0.05)
-        data = self.dev.read(self.ep_in.bEndpointAddress, 512, timeout=self.timeout)
-        return bytes(data).decode("ascii", "ignore").strip()
+        with self._io_lock:
+            self._write(scpi)
+            # blocking read: returns as soon as the reply is there
+            n = self.ep_in.read(self._rx, timeout=self.timeout)
+            return self._rx[:n].tobytes().decode("ascii", "ignore").strip()
+
+    def close(self):
+        with self._io_lock:
+            usb.util.release_interface(self.dev, self.intf.bInterfaceNumber)
+            usb.util.dispose_resources(self.dev)
+        _USB_CACHE.pop((self.dev.idVendor, self.dev.idProduct), None)
 
     # Convenience
     def idn(self):
         return self.query("*IDN?")
 
     def ch(self, n):
-        self.write(f":CHAN CH{1 if n==1 else 2}")
+        self.write(_CHAN_CMD[1 if n == 1 else 2])
+        self._setup = None  # selection may differ from the cached setup now
 
     def out(self, n, on=True):
-        self.write(f":CHAN:CH{1 if n==1 else 2} {'ON' if on else 'OFF'}")
+        self.write(_OUT_CMD[1 if n == 1 else 2, bool(on)])
+
+    def _retune(self, setup, freq, freq_cmd):
+        # Same channel/waveform/level as last time: only the frequency (if it
+        # moved) goes out, instead of the whole setup block per sweep point
+        if setup != self._setup:
+            return False
+        if freq != self._freq:
+            self.write(freq_cmd % freq)
+            self._freq = freq
+        return True
 
     def set_sine(self, ch, freq, vpp, offs=0.0, load="OFF"):
-        self.ch(ch)
-        self.write(":FUNC SINE")
-        self.write(f":FUNC:SINE:LOAD {load}")
-        self.write(f":FUNC:SINE:FREQ {freq}")
-        self.write(f":FUNC:SINE:AMPL {vpp}")
-        self.write(f":FUNC:SINE:OFFS {offs}")
+        setup = (1 if ch == 1 else 2, "SINE", vpp, offs, load)
+        if self._retune(setup, freq, ":FUNC:SINE:FREQ %.10g"):
+            return
+        self.write_batch(
+            [
+                _CHAN_CMD[1 if ch == 1 else 2],
+                ":FUNC SINE",
+                f":FUNC:SINE:LOAD {load}",
+                f":FUNC:SINE:FREQ {freq:.10g}",
+                f":FUNC:SINE:AMPL {vpp:.10g}",
+                f":FUNC:SINE:OFFS {offs:.10g}",
+            ]
+        )
+        self._setup, self._freq = setup, freq
 
     def set_square(self, ch, freq, vpp, offs=0.0, duty=50, load="OFF"):
-        self.ch(ch)
-        self.write(":FUNC SQU")
-        self.write(f":FUNC:SQU:LOAD {load}")
-        self.write(f":FUNC:SQU:FREQ {freq}")
-        self.write(f":FUNC:SQU:AMPL {vpp}")
-        self.write(f":FUNC:SQU:OFFS {offs}")
-        self.write(f":FUNC:SQU:DCYC {duty}")
+        setup = (1 if ch == 1 else 2, "SQU", vpp, offs, load, duty)
+        if self._retune(setup, freq, ":FUNC:SQU:FREQ %.10g"):
+            return
+        self.write_batch(
+            [
+                _CHAN_CMD[1 if ch == 1 else 2],
+                ":FUNC SQU",
+                f":FUNC:SQU:LOAD {load}",
+                f":FUNC:SQU:FREQ {freq:.10g}",
+                f":FUNC:SQU:AMPL {vpp:.10g}",
+                f":FUNC:SQU:OFFS {offs:.10g}",
+                f":FUNC:SQU:DCYC {duty:.10g}",
+            ]
+        )
+        self._setup, self._freq = setup, freq
 
 
 # -------------------- RTB2004 via PyVISA --------------------
@@ -115,82 +207,175 @@ def rm_open():
         return pyvisa.ResourceManager("@py")  # pure python backend
 
 
+CACHE_FILE = os.path.expanduser("~/.vna_cache.json")
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    try:
+        with open(CACHE_FILE, "w") as fh:
+            json.dump(cache, fh)
+    except OSError:
+        pass  # caching is only an optimisation
+
+
+# Resource strings are matched as listed; nothing is opened just to *IDN? it.
+# USB ones carry the vendor ID: USB0::0x0AAD::0x01D6::<serial>::INSTR
+_RTB_NAME = re.compile(r"RTB", re.I)
+_USB_VID = re.compile(r"USB\d*::0x([0-9A-F]{4})::", re.I)
+RS_VID = 0x0AAD  # Rohde & Schwarz
+
+
 def open_rtb(resource_manager):
+    # Last run's resource string first; list_resources() can take seconds
+    cache = _load_cache()
+    if cache.get("rtb"):
+        try:
+            inst = resource_manager.open_resource(cache["rtb"])
+            inst.timeout = 10000  # ms
+            return inst
+        except Exception:
+            pass  # gone or renumbered: fall back to enumeration
     # Pick the first VISA resource that looks like an RTB
     resources = resource_manager.list_resources()
     cand = None
     for r in resources:
-        if re.search(r"RTB|R&S.*RTB", r, re.I):
+        if _RTB_NAME.search(r):
             cand = r
             break
-        if "USB" in r and "0x0AAD" in r:  # R&S vendor ID
+        m = _USB_VID.match(r)
+        if m and int(m.group(1), 16) == RS_VID:
             cand = r
     if not cand:
         raise RuntimeError(f"RTB2004 not found. VISA resources: {resources}")
     inst = resource_manager.open_resource(cand)
     inst.timeout = 10000  # ms
+    cache["rtb"] = cand
+    _save_cache(cache)
     return inst
 
 
+# -------------------- Sin/cos projection --------------------
+RAD2DEG = 180.0 / math.pi  # per-point phases use math.atan2 on plain floats
+
+
+@lru_cache(maxsize=64)
+def sincos_refs(n_points, n_cycles):
+    """(n_points, 2) [sin | cos] over n_cycles whole periods; cached and read-only."""
+    t = np.linspace(0, n_cycles * 2 * np.pi, n_points)
+    refs = np.empty((n_points, 2))
+    refs[:, 0] = np.sin(t)
+    refs[:, 1] = np.cos(t)
+    refs.setflags(write=False)
+    return refs
+
+
+def _demod(x1, x2, refs):
+    S1, C1 = (x1 @ refs) / len(x1)
+    S2, C2 = (x2 @ refs) / len(x2)
+    return complex(S1, C1), complex(S2, C2)
+
+
+if njit is not None:
+
+    @njit(cache=True, fastmath=True)
+    def _demod(x1, x2, refs):
+        # same result, one pass over both channels with scalar accumulators
+        s1 = c1 = s2 = c2 = 0.0
+        for i in range(x1.shape[0]):
+            s1 += x1[i] * refs[i, 0]
+            c1 += x1[i] * refs[i, 1]
+            s2 += x2[i] * refs[i, 0]
+            c2 += x2[i] * refs[i, 1]
+        n = x1.shape[0]
+        return complex(s1 / n, c1 / n), complex(s2 / n, c2 / n)
+
+
+def demod(x1, x2, refs):
+    """Complex amplitudes (sin_dot + j*cos_dot) of both channels against refs."""
+    # the njit kernel does no bounds checking: a short capture would be read
+    # past its end into garbage phasors instead of failing
+    n = refs.shape[0]
+    if len(x1) != n or len(x2) != n:
+        raise ValueError(f"demod: {len(x1)}/{len(x2)} samples vs {n} reference points")
+    return _demod(x1, x2, refs)
+
+
 # -------------------- CLI (compatible with your original) --------------------
-FILEPREFIX = "RG1054Z"
-StartF = 1.0
-StopF = 1e6
-PointsPerDecade = 10
-SweepModeLog = True
-StepSizeF = None
-Voltage = 1.0
-Resistance = 0.0
-Sine = True
-PlotOK = True
-
-
-def NextArg(i):
-    if i + 1 >= len(sys.argv):
-        raise SystemExit(f"'{sys.argv[i]}' expected an argument")
-    return 1, sys.argv[i + 1]
-
-
-skip = 0
-for i in range(1, len(sys.argv)):
-    if skip:
-        skip = 0
-        continue
-    a = sys.argv[i]
-    if a.startswith("-f"):
-        skip, FILEPREFIX = NextArg(i)
-    elif a.startswith("-n"):
-        PlotOK = False
-    elif a.startswith("-q"):
-        Sine = False
-    elif a.startswith("-v"):
-        skip, Voltage = 1, float(NextArg(i)[1])
-    elif a.startswith("-z"):
-        skip, Resistance = 1, float(NextArg(i)[1])
-    elif a.startswith("-s"):
-        skip, StepSizeF = 1, float(NextArg(i)[1])
-        SweepModeLog = False
-    elif a.startswith("-b"):
-        skip, StartF = 1, float(NextArg(i)[1])
-    elif a.startswith("-e"):
-        skip, StopF = 1, float(NextArg(i)[1])
-    elif a.startswith("-p"):
-        skip, PointsPerDecade = 1, int(NextArg(i)[1])
-        SweepModeLog = True
-    elif a.startswith("-h"):
-        print(__doc__)
-        sys.exit(0)
-    elif a.startswith("-"):
-        print("Bad arg:", a)
-        sys.exit(1)
+def _usb_id(text):
+    # "VID:PID" in hex, e.g. 5345:1234
+    try:
+        vid, pid = (int(x, 16) for x in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected VID:PID in hex, e.g. 5345:1234")
+    return vid, pid
+
+
+ap = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+)
+ap.add_argument("-f", dest="FILEPREFIX", default="RG1054Z", help="log file prefix")
+ap.add_argument("-n", dest="PlotOK", action="store_false", help="no plots")
+ap.add_argument("-q", dest="Sine", action="store_false", help="square, not sine")
+ap.add_argument("-v", dest="Voltage", type=float, default=1.0, help="Vpp")
+ap.add_argument("-z", dest="Resistance", type=float, default=0.0, help="R_sense")
+ap.add_argument("-s", dest="StepSizeF", type=float, help="linear step (Hz)")
+ap.add_argument("-b", dest="StartF", type=float, default=1.0, help="begin (Hz)")
+ap.add_argument("-e", dest="StopF", type=float, default=1e6, help="end (Hz)")
+ap.add_argument("-p", dest="PointsPerDecade", type=int, default=10, help="pts/dec")
+ap.add_argument("-u", dest="UsbId", type=_usb_id, help="AG1022 USB VID:PID (hex)")
+args = ap.parse_args()
+
+FILEPREFIX = args.FILEPREFIX
+StartF, StopF = args.StartF, args.StopF
+PointsPerDecade = args.PointsPerDecade
+StepSizeF = args.StepSizeF
+SweepModeLog = StepSizeF is None  # -s selects a linear sweep
+Voltage = args.Voltage
+Resistance = args.Resistance
+Sine = args.Sine
+PlotOK = args.PlotOK
 
 # -------------------- Open instruments --------------------
-rm = rm_open()
-rtb = open_rtb(rm)
-print("RTB2004:", rtb.query("*IDN?").strip())
+# Scope (VISA) and generator (PyUSB) are on separate buses, so bring them up
+# side by side: VISA start-up/lookup and USB enumeration overlap, not add up.
+def _open_scope():
+    rm = rm_open()
+    rtb = open_rtb(rm)
+    return rm, rtb, rtb.query("*IDN?").strip()
+
 
-gen = AG1022USB()
-print("AG1022:", gen.idn())
+def _open_gen():
+    # -u VID:PID, else the pair that worked last run, else the stock AG1022 IDs
+    ids = args.UsbId or tuple(_load_cache().get("ag1022") or (VID_OWON, PID_OWON))
+    try:
+        gen = AG1022USB(*ids)
+    except RuntimeError:
+        if args.UsbId or ids == (VID_OWON, PID_OWON):
+            raise
+        ids = VID_OWON, PID_OWON  # remembered unit is gone: stock IDs
+        gen = AG1022USB(*ids)
+    return gen, gen.idn(), ids
+
+
+with ThreadPoolExecutor(max_workers=2) as ex:
+    scope_up, gen_up = ex.submit(_open_scope), ex.submit(_open_gen)
+    rm, rtb, rtb_idn = scope_up.result()
+    gen, gen_idn, gen_ids = gen_up.result()
+# written here, after open_rtb() has stored its entry, so neither is lost
+cache = _load_cache()
+if cache.get("ag1022") != list(gen_ids):
+    cache["ag1022"] = list(gen_ids)
+    _save_cache(cache)
+print("RTB2004:", rtb_idn)
+print("AG1022:", gen_idn)
 
 # -------------------- Configure generator (CH1 as source) --------------------
 gen.out(1, False)
@@ -201,152 +386,207 @@ else:
 gen.out(1, True)
 
 # -------------------- Configure RTB channels & transfer format ----------------
-# Turn CH1/CH2 on and AC couple (adjust to DC if you prefer).
+# Only MDEPTH points per channel are ever used, so ask for exactly that many
+# instead of pulling the MAX record over the bus and slicing it afterwards.
+MDEPTH = 30000
+# One compound message (one VISA transaction) for the whole setup:
+#   CH1/CH2 on, AC coupled (adjust to DC if you prefer), 5 V/div to start;
+#   REAL,32 (float) little-endian transfers of MDEPTH points per channel.
 rtb.write(
-    "CHAN1:STAT 1; CHAN2:STAT 1"
-)  # enable channels (RTB SCPI)  # see app-card example
-rtb.write("CHAN1:COUP AC; CHAN2:COUP AC")
-rtb.write("CHAN1:SCAL 5; CHAN2:SCAL 5")
-
-# Use REAL,32 (float) little-endian; fetch full record from memory (not just screen)
-rtb.write("FORM REAL,32; FORM:BORD LSBF")  # binary float32, little-endian
-# For full resolution you must request it, and acquisition must be stopped.  :contentReference[oaicite:1]{index=1}
-rtb.write("CHAN1:DATA:POIN MAX; CHAN2:DATA:POIN MAX")
+    "CHAN1:STAT 1; CHAN2:STAT 1; CHAN1:COUP AC; CHAN2:COUP AC; "
+    "CHAN1:SCAL 5; CHAN2:SCAL 5; FORM REAL,32; FORM:BORD LSBF; "
+    f"CHAN1:DATA:POIN {MDEPTH}; CHAN2:DATA:POIN {MDEPTH}"
+)
 
 # Single-acquisition synchronization hint:
 # We'll drive each step with SING and wait on *OPC?=1 when finished.  :contentReference[oaicite:2]{index=2}
 
 # -------------------- Prepare sweep --------------------
+# Whole frequency table built once up front; the loop just walks it
 if SweepModeLog:
     last_point = 1 + math.ceil(PointsPerDecade * math.log10(StopF / StartF))
-    freqs = [StartF * (10 ** (i / PointsPerDecade)) for i in range(last_point)]
+    freqs = StartF * np.logspace(0, (last_point - 1) / PointsPerDecade, last_point)
 else:
     last_point = 1 + math.ceil((StopF - StartF) / StepSizeF)
-    freqs = [StartF + i * StepSizeF for i in range(last_point)]
-freqs = [f for f in freqs if f <= StopF and f <= 25e6]  # AG1022 bandwidth guard
-
-MDEPTH = 30000
-VNA = []
+    freqs = StartF + StepSizeF * np.arange(last_point)
+# table is ascending, so the AG1022 bandwidth guard is a single cut
+freqs = freqs[: np.searchsorted(freqs, min(StopF, 25e6), side="right")]
+
+# Results as parallel arrays filled by index (VNA_N rows valid), not tuples
+VNA_F = np.empty(len(freqs))
+VNA_dB = np.empty(len(freqs))
+VNA_Ph = np.empty(len(freqs))
+VNA_X1 = np.empty(len(freqs), dtype=complex)  # raw channel phasors; |X|, Z
+VNA_X2 = np.empty(len(freqs), dtype=complex)  # are derived after the sweep
+VNA_N = 0
 ts = time.strftime("%Y-%m-%d %H:%M")
-LOGFile = open(FILEPREFIX + "_VNA.log", "w")
-print(f"# {ts}", file=LOGFile)
-print(
-    "#Sample,  Frequency,      Mag1,      Mag2, Ratio (dB),   Phase,  Z(re,im)",
-    file=LOGFile,
-)
 
-for idx, F in enumerate(freqs):
-    # Drive generator
+# Type q + Enter to end the sweep early; a daemon thread watches stdin so the
+# loop only checks an Event instead of polling the keyboard every point.
+stop_evt = threading.Event()
+
+
+def _watch_stdin():
+    for line in sys.stdin:
+        if line.strip().lower() == "q":
+            stop_evt.set()
+            return
+
+
+threading.Thread(target=_watch_stdin, daemon=True).start()
+
+
+def drive(F):
     if Sine:
         gen.set_sine(1, F, Voltage)
     else:
         gen.set_square(1, F, Voltage, duty=50)
 
-    # Aim ~12 periods on screen
-    rtb.write(
-        f"TIM:SCAL {1.0/F/12.0:.9f}"
-    )  # timebase scale (s/div). Manual uses TIM:SCAL.  :contentReference[oaicite:3]{index=3}
-
-    # Single run and wait until acquisition done
-    rtb.write("SING")
-    rtb.query(
-        "*OPC?"
-    )  # returns "1" when finished  :contentReference[oaicite:4]{index=4}
-
-    # Ensure we grab full record for both channels at this step
-    rtb.write(
-        "CHAN1:DATA:POIN MAX; CHAN2:DATA:POIN MAX"
-    )  # full resolution  :contentReference[oaicite:5]{index=5}
-
-    # Read headers -> [Xstart, Xstop, Npoints, ...]
-    h1 = rtb.query("CHAN1:DATA:HEAD?").strip().split(",")
-    n1 = int(float(h1[2])) if len(h1) >= 3 else MDEPTH
-
-    h2 = rtb.query("CHAN2:DATA:HEAD?").strip().split(",")
-    n2 = int(float(h2[2])) if len(h2) >= 3 else MDEPTH
-    NPOINTS = min(n1, n2, MDEPTH)
-
-    # Read binary float32 waveform data (little-endian)  :contentReference[oaicite:6]{index=6}
-    cur1 = np.array(
-        rtb.query_binary_values(
+
+# The AG1022 sits on its own USB pipe, so once a shot is frozen in scope memory
+# the next frequency is written on a worker while this one is fetched/processed.
+GEN = ThreadPoolExecutor(max_workers=1)
+pending = None
+
+try:
+    for idx, F in enumerate(freqs):
+        if stop_evt.is_set():
+            print("Sweep stopped by user")
+            break
+
+        # Drive generator (or wait for the write started during the last point)
+        if pending is None:
+            drive(F)
+        else:
+            pending.result()
+
+        # Aim ~12 periods on screen (TIM:SCAL is s/div), single run, and wait until
+        # the acquisition is done: *OPC? answers "1" exactly when it has finished.
+        # One compound message, so one VISA transaction instead of three.
+        rtb.query(f"TIM:SCAL {1.0/F/12.0:.9f}; SING; *OPC?")
+
+        # Capture is done; retune the generator under the transfer below
+        pending = GEN.submit(drive, freqs[idx + 1]) if idx + 1 < len(freqs) else None
+
+        # Re-arm the point count for both channels at this step (bounded to MDEPTH)
+        rtb.write(f"CHAN1:DATA:POIN {MDEPTH}; CHAN2:DATA:POIN {MDEPTH}")
+
+        # Read both headers in one round trip -> "Xstart,Xstop,Npoints,...;Xstart,..."
+        # (parsed in C, not per-token float())
+        h1, h2 = (
+            np.fromstring(h, sep=",")
+            for h in (
+                rtb.query("CHAN1:DATA:HEAD?; CHAN2:DATA:HEAD?").split(";") + [""]
+            )[:2]
+        )
+        n1 = int(h1[2]) if len(h1) >= 3 else MDEPTH
+        n2 = int(h2[2]) if len(h2) >= 3 else MDEPTH
+        NPOINTS = min(n1, n2, MDEPTH)
+
+        # Read binary float32 waveform data (little-endian)  :contentReference[oaicite:6]{index=6}
+        # (container=np.array already yields an ndarray; slicing is a view, no copy)
+        cur1 = rtb.query_binary_values(
             "CHAN1:DATA?",
             datatype="f",
             is_big_endian=False,
             container=np.array,
             header_fmt="ieee",
         )[:NPOINTS]
-    )
-    cur2 = np.array(
-        rtb.query_binary_values(
+        cur2 = rtb.query_binary_values(
             "CHAN2:DATA?",
             datatype="f",
             is_big_endian=False,
             container=np.array,
             header_fmt="ieee",
         )[:NPOINTS]
-    )
 
-    # Project onto sin/cos over an integer number of cycles
-    # Approximate samples-per-cycle from header span:
-    try:
-        x0, x1 = float(h1[0]), float(h1[1])
-        xincr = (x1 - x0) / max(1, n1 - 1)
-    except Exception:
-        xincr = 1.0 / (F * 1000.0)  # fallback
-    n_per_cycle = 1.0 / (F * xincr)
-    n_cycles = max(1, math.floor(NPOINTS / n_per_cycle))
-    N = int(round(n_cycles * n_per_cycle))
-
-    t = np.linspace(0, n_cycles * 2 * np.pi, N)
-    s = np.sin(t)
-    c = np.cos(t)
-
-    x1c = cur1[:N]
-    x2c = cur2[:N]
-    S1 = np.dot(x1c, s) / N
-    C1 = np.dot(x1c, c) / N
-    S2 = np.dot(x2c, s) / N
-    C2 = np.dot(x2c, c) / N
-
-    X1 = complex(S1, C1)
-    X2 = complex(S2, C2)
-    MAG1 = 2 * abs(X1)
-    PH1 = np.angle(X1, deg=True)
-    MAG2 = 2 * abs(X2)
-    PH2 = np.angle(X2, deg=True)
-
-    # Auto-rescale channels a bit for the next shot
-    rtb.write(f"CHAN1:SCAL {max(1e-3, MAG1/3):.4f}; CHAN2:SCAL {max(1e-3, MAG2/3):.4f}")
-
-    Mag_dB = 20 * np.log10(MAG2 / MAG1) if MAG1 > 0 else float("nan")
-    Phase = (PH2 - PH1) % 360.0
-    if Phase > 180.0:
-        Phase -= 360.0
-
-    Z = complex(0.0, 0.0)
+        # Project onto sin/cos over an integer number of cycles
+        # Approximate samples-per-cycle from header span:
+        try:
+            x0, x1 = h1[0], h1[1]
+            xincr = (x1 - x0) / max(1, n1 - 1)
+        except Exception:
+            xincr = 1.0 / (F * 1000.0)  # fallback
+        n_per_cycle = 1.0 / (F * xincr)
+        n_cycles = max(1, math.floor(NPOINTS / n_per_cycle))
+        N = int(round(n_cycles * n_per_cycle))
+        if N > min(len(cur1), len(cur2)):
+            # record shorter than one whole cycle: nothing to project onto
+            print(f"Sample {idx:3d}, {F:11.3f} Hz, skipped ({N} pts needed)")
+            continue
+
+        # [sin | cos] columns: one matmul per channel gives both dot products
+        X1, X2 = demod(cur1[:N], cur2[:N], sincos_refs(N, n_cycles))
+        MAG1 = 2 * abs(X1)
+        PH1 = math.atan2(X1.imag, X1.real) * RAD2DEG
+        MAG2 = 2 * abs(X2)
+        PH2 = math.atan2(X2.imag, X2.real) * RAD2DEG
+
+        # Auto-rescale channels a bit for the next shot
+        rtb.write(
+            f"CHAN1:SCAL {max(1e-3, MAG1/3):.4f}; CHAN2:SCAL {max(1e-3, MAG2/3):.4f}"
+        )
+
+        Mag_dB = 20 * math.log10(MAG2 / MAG1) if MAG1 > 0 and MAG2 > 0 else float("nan")
+        Phase = (PH2 - PH1) % 360.0
+        if Phase > 180.0:
+            Phase -= 360.0
+
+        print(
+            f"Sample {idx:3d}, {F:11.3f} Hz, {N} pts  ->  {Mag_dB:7.2f} dB, {Phase:7.2f}°"
+        )
+        VNA_F[VNA_N], VNA_dB[VNA_N], VNA_Ph[VNA_N] = F, Mag_dB, Phase
+        VNA_X1[VNA_N], VNA_X2[VNA_N] = X1, X2
+        VNA_N += 1
+finally:
+    GEN.shutdown(wait=True)
+    # the log is written even when the sweep dies or is interrupted (Ctrl-C)
+    # part-way, so the points measured so far are kept
+
+    # Whole-sweep vector math instead of per-point complex objects
+    n = VNA_N
+    VNA_M1 = 2 * np.abs(VNA_X1[:n])
+    VNA_M2 = 2 * np.abs(VNA_X2[:n])
+    VNA_Z = np.zeros(n, dtype=complex)
     if Resistance:
         # divider model: Zload = V2 / (V1 - V2) * R
-        Z = (X2 / (X1 - X2)) * Resistance
-
-    print(
-        f"Sample {idx:3d}, {F:11.3f} Hz, {N} pts  ->  {Mag_dB:7.2f} dB, {Phase:7.2f}°"
-    )
-    print(
-        f"{idx:6d}, {F:12.3f}, {MAG1:9.5f}, {MAG2:9.5f}, {Mag_dB:7.2f}, {Phase:7.2f},  {Z.real:12.4f} {Z.imag:+12.4f}",
-        file=LOGFile,
+        VNA_Z = VNA_X2[:n] / (VNA_X1[:n] - VNA_X2[:n]) * Resistance
+
+    # One formatted write for the whole log, same layout as the old per-row prints
+    np.savetxt(
+        FILEPREFIX + "_VNA.log",
+        np.column_stack(
+            (
+                np.arange(n),
+                VNA_F[:n],
+                VNA_M1,
+                VNA_M2,
+                VNA_dB[:n],
+                VNA_Ph[:n],
+                VNA_Z.real,
+                VNA_Z.imag,
+            )
+        ),
+        fmt="%6d, %12.3f, %9.5f, %9.5f, %7.2f, %7.2f,  %12.4f %+12.4f",
+        header=f"# {ts}\n"
+        "#Sample,  Frequency,      Mag1,      Mag2, Ratio (dB),   Phase,  Z(re,im)",
+        comments="",
     )
-    VNA.append((F, Mag_dB, Phase, Z))
 
-LOGFile.close()
 rtb.close()
 rm.close()
+gen.close()
 print("Done; log ->", FILEPREFIX + "_VNA.log")
 
 # -------------------- Plots --------------------
-if PlotOK and VNA:
-    F = np.array([x[0] for x in VNA])
-    G = np.array([x[1] for x in VNA])
-    P = np.array([x[2] for x in VNA])
+# Every instrument handle is released above, so a plot window left open holds
+# nothing; matplotlib is only imported here, and not at all with -n.
+if PlotOK and VNA_N:
+    import matplotlib.pyplot as plt
+
+    F = VNA_F[:VNA_N]
+    G = VNA_dB[:VNA_N]
+    P = VNA_Ph[:VNA_N]
 
     fig, ax1 = plt.subplots()
     ax1.set_title("CH2 / CH1")
@@ -358,11 +598,10 @@ if PlotOK and VNA:
     ax2.set_ylabel("Phase (°)")
     (ax2.semilogx if SweepModeLog else ax2.plot)(F, P)
     fig.tight_layout()
-    plt.show(block=False)
 
     if Resistance:
-        Zmag = np.array([abs(x[3]) for x in VNA])
-        Zph = np.array([np.angle(x[3], deg=True) for x in VNA])
+        Zmag = np.abs(VNA_Z)
+        Zph = np.angle(VNA_Z, deg=True)
         fig2, ax3 = plt.subplots()
         ax3.set_title("Impedance |Z| & ∠Z")
         ax3.set_xlabel("Frequency (Hz)")
@@ -373,4 +612,4 @@ if PlotOK and VNA:
         ax4.set_ylabel("∠Z (°)")
         (ax4.semilogx if SweepModeLog else ax4.plot)(F, Zph)
         fig2.tight_layout()
-        plt.show(block=True)
+    plt.show()  # one blocking call for all figures